@@ -0,0 +1,80 @@
+"""
+Micro-benchmark of the parsing and unification of the authors of the
+specs, as done when the catalog is loaded.
+
+    python -m benchmarks.bench_authors
+"""
+
+import random
+import timeit
+
+from webapp.authors import normalize_name, parse_authors, unify_authors
+
+FIRST_NAMES = [
+    "José",
+    "Jose",
+    "María",
+    "Zoë",
+    "Søren",
+    "Łukasz",
+    "François",
+    "Jürgen",
+    "Ana",
+    "John",
+    "Priya",
+    "Björn",
+    "Iñaki",
+    "Mehmet",
+    "Ahmed",
+]
+LAST_NAMES = [
+    "García",
+    "Garcia",
+    "Müller",
+    "Nørgaard",
+    "Wałęsa",
+    "Smith",
+    "Doe",
+    "Çelik",
+    "Dvořák",
+    "O'Brien",
+    "Pérez",
+    "Kowalski",
+]
+
+
+def make_authors(rng):
+    authors = []
+    for _ in range(rng.randint(1, 4)):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        if rng.random() < 0.3:
+            name = name.upper() if rng.random() < 0.5 else name.lower()
+        if rng.random() < 0.3:
+            name += " <someone@canonical.com>"
+        elif rng.random() < 0.2:
+            name += " (canonical)"
+        authors.append(name)
+    return ", ".join(authors)
+
+
+def load_catalog_authors(raw_authors):
+    specs = [{"authors": parse_authors(authors)} for authors in raw_authors]
+    return unify_authors(specs)
+
+
+def main(number_of_specs=1000, repeat=20):
+    rng = random.Random(0)
+    raw_authors = [make_authors(rng) for _ in range(number_of_specs)]
+
+    normalize_name.cache_clear()
+    cold = timeit.timeit(lambda: load_catalog_authors(raw_authors), number=1)
+    warm = (
+        timeit.timeit(lambda: load_catalog_authors(raw_authors), number=repeat)
+        / repeat
+    )
+    print(f"{number_of_specs} specs, cold cache: {cold * 1000:.2f} ms")
+    print(f"{number_of_specs} specs, warm cache: {warm * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
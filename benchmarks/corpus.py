@@ -0,0 +1,247 @@
+"""
+Synthetic specs corpus, and stand-ins for the Drive and Sheets clients
+serving it, to run the benchmarks without Google APIs.
+
+Documents are generated from their ID when they are requested, so large
+corpora don't need to be kept in memory.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from webapp.google import RowBuffer
+from webapp.settings import SPECS_SHEET_TITLE, TMP_SHEET_TITLE
+
+TEAMS = ["Web", "Desktop", "Server", "Kernel", "Snaps", "Juju", "Security"]
+STATUSES = ["Drafting", "Pending review", "Approved", "Completed", "Active"]
+TYPES = ["Standard", "Informational", "Process"]
+NAMES = [
+    "José García",
+    "Jane Doe",
+    "Łukasz Kowalski",
+    "Søren Nørgaard",
+    "Priya Patel",
+    "John Smith",
+    "Zoë Müller",
+    "Ahmed Çelik",
+]
+WORDS = (
+    "snap charm kernel ubuntu release package image cloud store desktop "
+    "server security update design proposal review install build test"
+).split()
+
+DOC_HTML = """<html><head>
+<meta content="text/html; charset=UTF-8" http-equiv="content-type">
+<style type="text/css">{style}</style></head>
+<body class="c5 doc-content">
+<table class="c2">
+<tr><td class="c3"><p><span>Index</span></p></td><td>{index}</td></tr>
+<tr><td><p><span>Title</span></p></td><td><p><span>{title}</span></p></td></tr>
+<tr><td><p><span>Status</span></p></td><td><p><span>{status}</span></p></td></tr>
+<tr><td><p><span>Authors</span></p></td><td><p><span>{authors}</span></p></td></tr>
+<tr><td><p><span>Type</span></p></td><td><p><span>{type}</span></p></td></tr>
+<tr><td><p><span>Created</span></p></td><td><p><span>{created}</span></p></td></tr>
+</table>
+{body}
+</body></html>"""  # noqa: E501
+
+PARAGRAPH = (
+    '<h2 class="c4" id="h.{n}"><span class="c1">{heading}</span></h2>'
+    '<p class="c6"><span class="c1">{text}</span><span></span></p>'
+    '<p><span><span class="c7"> </span></span></p>'
+    '<ul class="c8"><li class="c9"><span>{item}</span></li></ul>'
+)
+
+
+class Corpus:
+    """
+    `size` specs spread over TEAMS, with documents of `paragraphs`
+    sections (about 400 bytes each) on average
+    """
+
+    def __init__(self, size: int, paragraphs: int = 50, seed: int = 0):
+        self.size = size
+        self.paragraphs = paragraphs
+        self.seed = seed
+        start = datetime(2020, 1, 1)
+
+        rng = random.Random(seed)
+        self.files_by_team = {team: [] for team in TEAMS}
+        self.files = {}
+        for n in range(size):
+            team = TEAMS[n % len(TEAMS)]
+            file_id = f"doc-{n:06}"
+            modified = start + timedelta(minutes=rng.randrange(10**6))
+            file = {
+                "id": file_id,
+                "name": f"{team[:2].upper()}{n:03} - Spec {n}",
+                "createdTime": "2020-01-01T00:00:00.000Z",
+                "modifiedTime": modified.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "webViewLink": f"https://docs.google.com/document/d/{file_id}",
+                "parents": [team],
+            }
+            self.files[file_id] = file
+            self.files_by_team[team].append(file)
+
+    def metadata(self, file_id: str) -> dict:
+        rng = random.Random(f"{self.seed}-{file_id}")
+        n = int(file_id.split("-")[1])
+        team = TEAMS[n % len(TEAMS)]
+        return {
+            "folderName": team,
+            "index": f"{team[:2].upper()}{n:03}",
+            "title": " ".join(rng.choices(WORDS, k=4)).capitalize(),
+            "status": rng.choice(STATUSES),
+            "authors": ", ".join(rng.sample(NAMES, rng.randint(1, 3))),
+            "type": rng.choice(TYPES),
+        }
+
+    def doc_html(self, file_id: str) -> str:
+        rng = random.Random(f"{self.seed}-{file_id}-body")
+        metadata = self.metadata(file_id)
+        count = rng.randint(self.paragraphs // 2, self.paragraphs * 3 // 2)
+        body = "".join(
+            PARAGRAPH.format(
+                n=n,
+                heading=" ".join(rng.choices(WORDS, k=3)),
+                text=" ".join(rng.choices(WORDS, k=40)),
+                item=" ".join(rng.choices(WORDS, k=8)),
+            )
+            for n in range(count)
+        )
+        return DOC_HTML.format(
+            style=".c1{font-weight:700}" * 200,
+            created="1 Jan 2020",
+            body=body,
+            **metadata,
+        )
+
+    def specs(self) -> list:
+        """
+        The specs as in specs.json
+        """
+        return [
+            dict(
+                self.metadata(file_id),
+                fileName=file["name"],
+                fileID=file_id,
+                fileURL=file["webViewLink"],
+                created="01 Jan 2020",
+                lastUpdated=datetime.strptime(
+                    file["modifiedTime"], "%Y-%m-%dT%H:%M:%S.000Z"
+                ).strftime("%d %b %Y"),
+                numberOfComments=3,
+                openComments=1,
+            )
+            for file_id, file in self.files.items()
+        ]
+
+    def sheet(self) -> dict:
+        """
+        The specs sheet as returned by Sheets.get_sheet_by_title
+        """
+
+        def string(value):
+            return {"userEnteredValue": {"stringValue": value}}
+
+        def date(value):
+            return {"formattedValue": value}
+
+        def number(value):
+            return {"userEnteredValue": {"numberValue": value}}
+
+        row_data = []
+        for spec in self.specs():
+            file = self.files[spec["fileID"]]
+            row_data.append(
+                {
+                    "values": [
+                        string(spec["folderName"]),
+                        string(spec["fileName"]),
+                        string(spec["fileID"]),
+                        string(spec["fileURL"]),
+                        string(spec["index"]),
+                        string(spec["title"]),
+                        string(spec["status"]),
+                        string(spec["authors"]),
+                        string(spec["type"]),
+                        date(file["createdTime"]),
+                        date(file["modifiedTime"]),
+                        number(3),
+                        number(1),
+                    ]
+                }
+            )
+        return {"data": [{"rowData": row_data}]}
+
+
+class CorpusDrive:
+    """
+    Stand-in for webapp.google.Drive serving a corpus
+    """
+
+    def __init__(self, corpus: Corpus):
+        self.corpus = corpus
+
+    def get_files(self, query, fields=None):
+        # Only used to list the team folders
+        return [{"id": team, "name": team} for team in TEAMS]
+
+    def get_files_in_folders(self, folder_ids, query, fields):
+        return {
+            folder_id: self.corpus.files_by_team[folder_id]
+            for folder_id in folder_ids
+        }
+
+    def get_file(self, file_id, fields=None):
+        return self.corpus.files[file_id]
+
+    def get_comments_bulk(self, file_ids):
+        return {
+            file_id: {"numberOfComments": 3, "openComments": 1}
+            for file_id in file_ids
+        }
+
+    def doc_html(self, document_id):
+        return self.corpus.doc_html(document_id).encode()
+
+    def doc_html_chunks(self, document_id, chunk_size=256 * 1024):
+        html = self.doc_html(document_id)
+        for start in range(0, len(html), chunk_size):
+            end = start + chunk_size
+            yield html[start:end]
+
+
+class CorpusSheets:
+    """
+    Stand-in for webapp.google.Sheets, keeping the rows in memory
+    """
+
+    def __init__(self, spreadsheet_id=None, corpus: Corpus = None):
+        self.corpus = corpus
+        self.rows = []
+        self.names = {1: SPECS_SHEET_TITLE, 2: TMP_SHEET_TITLE}
+
+    def get_sheet_by_title(self, title, ranges=None):
+        sheet_id = next(i for i, n in self.names.items() if n == title)
+        sheet = {"properties": {"sheetId": sheet_id, "title": title}}
+        if ranges and self.corpus:
+            sheet.update(self.corpus.sheet())
+        return sheet
+
+    def clear(self, sheet_id):
+        self.rows = []
+
+    def insert_rows(self, rows, range):
+        self.rows.extend(rows)
+
+    def row_buffer(self, range, chunk_size=1000):
+        return RowBuffer(self, range=range, chunk_size=chunk_size)
+
+    def swap_sheet_names(self, sheet, other_sheet):
+        sheet_id = sheet["properties"]["sheetId"]
+        other_id = other_sheet["properties"]["sheetId"]
+        self.names[sheet_id], self.names[other_id] = (
+            self.names[other_id],
+            self.names[sheet_id],
+        )
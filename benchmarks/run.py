@@ -0,0 +1,243 @@
+"""
+Benchmarks of the hot paths of the app and of the update job, over
+synthetic corpora of specs (see corpus.py), without Google APIs.
+
+    python -m benchmarks.run --sizes 100,1000,50000 --output results.json
+
+Results are written as JSON, to compare them across commits. The app
+reads its settings when imported: PRIVATE_KEY and SECRET_KEY need to be
+set, as for the tests.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from unittest import mock
+
+from benchmarks.corpus import Corpus, CorpusDrive, CorpusSheets
+
+BENCHMARKS = {}
+
+
+def benchmark(function):
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+def summarize(durations):
+    durations = sorted(durations)
+    return {
+        "count": len(durations),
+        "total": sum(durations),
+        "mean": statistics.mean(durations),
+        "p50": durations[len(durations) // 2],
+        "p95": durations[int(len(durations) * 0.95)],
+        "max": durations[-1],
+    }
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+@benchmark
+def spec_parse(corpus, options):
+    """
+    Parse and clean whole documents, as for /spec-details
+    """
+    from webapp.spec import Spec
+
+    documents = [
+        (file_id, corpus.doc_html(file_id).encode())
+        for file_id in list(corpus.files)[: options.sample]
+    ]
+    return summarize(
+        [timed(Spec, None, file_id, html) for file_id, html in documents]
+    )
+
+
+@benchmark
+def metadata_parse(corpus, options):
+    """
+    Parse the metadata table of documents, as in the update job
+    """
+    from webapp.spec import Spec
+
+    drive = CorpusDrive(corpus)
+    return summarize(
+        [
+            timed(Spec.metadata_only, drive, file_id)
+            for file_id in list(corpus.files)[: options.sample]
+        ]
+    )
+
+
+@benchmark
+def generate_specs(corpus, options):
+    """
+    Read the specs from the rows of the spreadsheet, as in build_specs
+    """
+    from webapp.build_specs import generate_specs
+
+    rows = corpus.sheet()["data"][0]["rowData"]
+    return {"total": timed(lambda: list(generate_specs(rows)))}
+
+
+@benchmark
+def update_sheet(corpus, options):
+    """
+    Run the update job end to end, then again with nothing modified
+    """
+    from webapp import update
+
+    with tempfile.TemporaryDirectory() as directory, mock.patch.object(
+        update, "Drive", lambda: CorpusDrive(corpus)
+    ), mock.patch.object(
+        update, "Sheets", lambda spreadsheet_id: CorpusSheets()
+    ), mock.patch.object(
+        update, "UPDATE_STATE_FILE", os.path.join(directory, "state.json")
+    ), mock.patch.object(
+        update, "UPDATE_PROCESSES", options.processes
+    ):
+        return {
+            "full": timed(update.update_sheet, True),
+            "incremental": timed(update.update_sheet),
+        }
+
+
+@benchmark
+def routes(corpus, options):
+    """
+    Request the pages of the app from concurrent clients
+    """
+    from webapp import app as webapp
+    from webapp.cache import SQLiteCache
+    from webapp.catalog import Catalog
+    from webapp.details import SpecDetails
+
+    catalog = Catalog(corpus.specs())
+    author = catalog.specs[0]["authors"][0]
+    document_ids = list(corpus.files)[: options.sample]
+    urls = {
+        "/": ["/"],
+        "/my-specs": ["/my-specs"],
+        "/catalog.json": [f"/catalog.json?v={catalog.version}"],
+        "/api/specs": ["/api/specs?q=snap&status=Approved&sortBy=name"],
+        "/spec-details": [f"/spec-details/{d}" for d in document_ids],
+    }
+
+    local = threading.local()
+
+    def get(url):
+        if not hasattr(local, "client"):
+            local.client = webapp.app.test_client()
+            with local.client.session_transaction() as session:
+                session["openid"] = {"fullname": author}
+        start = time.perf_counter()
+        response = local.client.get(url)
+        duration = time.perf_counter() - start
+        assert response.status_code == 200, (url, response.status_code)
+        return duration
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        details = SpecDetails(
+            CorpusDrive(corpus),
+            SQLiteCache(os.path.join(directory, "cache.db"), 10**9),
+            revalidate_after=3600,
+        )
+        with mock.patch.object(
+            webapp.catalog_loader, "catalog", catalog
+        ), mock.patch.object(webapp, "spec_details", details):
+            for route, route_urls in urls.items():
+                requests = [
+                    route_urls[i % len(route_urls)]
+                    for i in range(options.requests)
+                ]
+                start = time.perf_counter()
+                with ThreadPoolExecutor(options.concurrency) as pool:
+                    durations = list(pool.map(get, requests))
+                elapsed = time.perf_counter() - start
+                results[route] = dict(
+                    summarize(durations),
+                    requests_per_second=len(requests) / elapsed,
+                )
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        default="100,1000",
+        help="Numbers of specs of the corpora, comma-separated",
+    )
+    parser.add_argument(
+        "--benchmarks",
+        default=",".join(BENCHMARKS),
+        help="Benchmarks to run, comma-separated",
+    )
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=50,
+        help="Documents parsed or requested by the benchmarks",
+    )
+    parser.add_argument("--paragraphs", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=0,
+        help="UPDATE_PROCESSES of the update job",
+    )
+    parser.add_argument("--output", help="JSON file, stdout by default")
+    options = parser.parse_args()
+
+    results = []
+    for size in [int(size) for size in options.sizes.split(",")]:
+        corpus = Corpus(size, paragraphs=options.paragraphs)
+        for name in options.benchmarks.split(","):
+            result = BENCHMARKS[name](corpus, options)
+            results.append({"benchmark": name, "specs": size, **result})
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "options": vars(options),
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,35 @@
 import React from "react";
 import ReactDOM from "react-dom/client";
 import App from "./App";
+import ErrorComponent from "./Error";
+import { Catalog } from "./types";
+import { decodeCatalog } from "./utils";
 import "./styles.scss";
 
-ReactDOM.createRoot(document.getElementById("root") as HTMLElement).render(
-  <React.StrictMode>
-    {/* @ts-ignore */}
-    <App specs={specs} teams={teams} />
-  </React.StrictMode>
+const root = ReactDOM.createRoot(
+  document.getElementById("root") as HTMLElement
 );
+
+// @ts-ignore
+catalog
+  .then((data: Catalog) => {
+    // @ts-ignore
+    const specs = decodeCatalog(data, positions);
+
+    root.render(
+      <React.StrictMode>
+        {/* @ts-ignore */}
+        <App specs={specs} teams={teams} />
+      </React.StrictMode>
+    );
+  })
+  .catch((error: Error) => {
+    // e.g. the session expired, and the catalog request was redirected to
+    // the login page
+    console.error(error);
+    root.render(
+      <React.StrictMode>
+        <ErrorComponent error="Unable to load the specs" />
+      </React.StrictMode>
+    );
+  });
@@ -0,0 +1,31 @@
+import { decodeCatalog } from "../utils";
+
+describe("decodes the catalog", () => {
+  const catalog = {
+    length: 2,
+    columns: {
+      index: ["WD001", "DT002"],
+      folderName: [0, 1],
+      authors: [["test_author"], ["test_author", "other_author"]],
+    },
+    dictionaries: {
+      folderName: ["Web", "Desktop"],
+    },
+  };
+
+  it("decodes all the specs", () => {
+    expect(decodeCatalog(catalog)).toEqual([
+      { index: "WD001", folderName: "Web", authors: ["test_author"] },
+      {
+        index: "DT002",
+        folderName: "Desktop",
+        authors: ["test_author", "other_author"],
+      },
+    ]);
+  });
+
+  it("decodes the specs at the given positions", () => {
+    const specs = decodeCatalog(catalog, [1]);
+    expect(specs.map((spec) => spec.index)).toEqual(["DT002"]);
+  });
+});
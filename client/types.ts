@@ -37,3 +37,9 @@ export type MoreSpecDetails = {
 };
 
 export type Team = string;
+
+export type Catalog = {
+  length: number;
+  columns: { [field: string]: any[] };
+  dictionaries: { [field: string]: any[] };
+};
@@ -1,3 +1,5 @@
+import { Catalog, Spec } from "./types";
+
 /**
  * Sort elements in set in alphabetical order and eliminate empty values.
  * @param elements list of elements
@@ -14,3 +16,29 @@ export function sortSet(elements: Set<string>): string[] {
 export function capitalize(s: string) {
   return s[0].toUpperCase() + s.slice(1);
 }
+
+/**
+ * Decode the specs from the columnar layout of the catalog, with one list
+ * of values per field, where dictionary-encoded fields are positions in
+ * the list of their distinct values.
+ * @param catalog catalog served by /catalog.json
+ * @param positions positions of the specs to decode, all of them if null
+ */
+export function decodeCatalog(
+  catalog: Catalog,
+  positions: number[] | null = null
+): Spec[] {
+  const { columns, dictionaries } = catalog;
+  const fields = Object.keys(columns);
+  const specPositions =
+    positions ?? Array.from({ length: catalog.length }, (_, i) => i);
+
+  return specPositions.map((position) => {
+    const spec: { [field: string]: any } = {};
+    fields.forEach((field) => {
+      const value = columns[field][position];
+      spec[field] = dictionaries[field] ? dictionaries[field][value] : value;
+    });
+    return spec as Spec;
+  });
+}
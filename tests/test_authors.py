@@ -0,0 +1,20 @@
+import unittest
+
+from webapp.authors import normalize_name, parse_authors
+
+
+class TestAuthors(unittest.TestCase):
+    def test_parse_authors(self):
+        self.assertEqual(
+            parse_authors("Jane Doe <jane@canonical.com>, John (canonical)"),
+            ["Jane Doe", "John"],
+        )
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("José GARCÍA"), "jose garcia")
+        self.assertEqual(normalize_name("Łukasz Wałęsa"), "lukasz walesa")
+        self.assertEqual(normalize_name("Søren Dvořák"), "soren dvorak")
+
+
+if __name__ == "__main__":
+    unittest.main()
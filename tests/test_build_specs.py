@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+import unittest
+
+from webapp.build_specs import generate_specs
+from webapp.utils import write_json_array
+
+
+def string(value):
+    return {"userEnteredValue": {"stringValue": value}}
+
+
+class TestBuildSpecs(unittest.TestCase):
+    def test_write_specs(self):
+        rows = [
+            {
+                "values": [
+                    string("Web"),
+                    string("WD001 - Spec"),
+                    string("doc"),
+                    string("https://docs.google.com/document/d/doc"),
+                    string("WD001"),
+                    string("Spec"),
+                    string("Drafting"),
+                    string("Jane Doe"),
+                    string("Standard"),
+                    {"formattedValue": "2020-01-01T00:00:00.000Z"},
+                    {"formattedValue": "2020-02-01T00:00:00.000Z"},
+                    {"userEnteredValue": {"numberValue": 3}},
+                ]
+            },
+            # Empty rows and rows without a file name are skipped
+            {},
+            {"values": [string("Web"), {}]},
+        ]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "specs.json")
+            write_json_array(path, generate_specs(iter(rows)))
+            with open(path) as f:
+                specs = json.load(f)
+
+        self.assertEqual(len(specs), 1)
+        self.assertEqual(specs[0]["index"], "WD001")
+        self.assertEqual(specs[0]["lastUpdated"], "01 Feb 2020")
+        self.assertEqual(specs[0]["numberOfComments"], 3)
+        self.assertEqual(specs[0]["openComments"], "")
+
+    def test_no_specs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "specs.json")
+            write_json_array(path, generate_specs([]))
+            with open(path) as f:
+                self.assertEqual(json.load(f), [])
+
+    def test_failed_write(self):
+        def specs():
+            yield {"index": "WD001"}
+            raise OSError("Unable to read the sheet")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "specs.json")
+            with self.assertRaises(OSError):
+                write_json_array(path, specs())
+
+            # No temporary file left behind
+            self.assertEqual(os.listdir(directory), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from webapp.catalog import Catalog, CatalogLoader
+
+
+def make_spec(**kwargs):
+    spec = {
+        "folderName": "Web",
+        "fileName": "WD001 - Test spec",
+        "fileID": "file-id",
+        "fileURL": "https://docs.google.com/document/d/file-id",
+        "index": "WD001",
+        "title": "Test spec",
+        "status": "Drafting",
+        "authors": "Test user <test@canonical.com>",
+        "type": "Standard",
+        "created": "01 Jan 2023",
+        "lastUpdated": "02 Jan 2023",
+        "numberOfComments": 2,
+        "openComments": 1,
+    }
+    spec.update(kwargs)
+    return spec
+
+
+class TestCatalog(unittest.TestCase):
+    def test_parses_and_unifies_authors(self):
+        """
+        Authors should be parsed and spelling variants unified once,
+        when the catalog is built
+        """
+        catalog = Catalog(
+            [
+                make_spec(authors="José García (canonical), Jane Doe"),
+                make_spec(fileID="other", authors="jose garcia"),
+            ]
+        )
+
+        self.assertEqual(
+            catalog.specs[0]["authors"], ["José García", "Jane Doe"]
+        )
+        self.assertEqual(catalog.specs[1]["authors"], ["José García"])
+
+    def test_does_not_mutate_raw_specs(self):
+        raw_spec = make_spec()
+        Catalog([raw_spec])
+
+        self.assertEqual(raw_spec["authors"], "Test user <test@canonical.com>")
+
+    def test_sorted_teams(self):
+        catalog = Catalog(
+            [
+                make_spec(folderName="Web"),
+                make_spec(folderName=""),
+                make_spec(folderName="Desktop"),
+                make_spec(folderName="Web"),
+            ]
+        )
+
+        self.assertEqual(catalog.teams, ("Desktop", "Web"))
+
+    def test_json_is_safe_to_embed(self):
+        catalog = Catalog([make_spec(folderName="</script><script>")])
+
+        self.assertNotIn("</script>", catalog.teams_json)
+
+    def test_columnar_payload(self):
+        catalog = Catalog(
+            [
+                make_spec(fileID="1", status="Drafting"),
+                make_spec(fileID="2", status="Approved"),
+                make_spec(fileID="3", status="Drafting"),
+            ]
+        )
+
+        payload = json.loads(gzip.decompress(catalog.payload_gzip))
+        self.assertEqual(payload["length"], 3)
+        self.assertEqual(payload["columns"]["fileID"], ["1", "2", "3"])
+        self.assertEqual(payload["columns"]["status"], [0, 1, 0])
+        self.assertEqual(
+            payload["dictionaries"]["status"], ["Drafting", "Approved"]
+        )
+        self.assertEqual(payload["columns"]["authors"][0], ["Test user"])
+
+    def test_version_changes_with_content(self):
+        version = Catalog([make_spec()]).version
+
+        self.assertEqual(Catalog([make_spec()]).version, version)
+        self.assertNotEqual(Catalog([make_spec(title="New")]).version, version)
+
+    def test_get_by_index(self):
+        catalog = Catalog([make_spec()])
+
+        self.assertEqual(catalog.get_by_index("wd001")["fileID"], "file-id")
+        self.assertIsNone(catalog.get_by_index("WD002"))
+
+    def test_for_author(self):
+        """
+        Specs should be found for an author regardless of case and accents
+        """
+        catalog = Catalog(
+            [
+                make_spec(fileID="1", folderName="Web", authors="José García"),
+                make_spec(fileID="2", folderName="", authors="Jane Doe"),
+                make_spec(
+                    fileID="3",
+                    folderName="Desktop",
+                    authors="Jane Doe, jose garcia, Jose Garcia",
+                ),
+            ]
+        )
+
+        user_specs = catalog.for_author("JOSE GARCÍA")
+        self.assertEqual([s["fileID"] for s in user_specs.specs], ["1", "3"])
+        self.assertEqual(user_specs.teams, ("Desktop", "Web"))
+        self.assertEqual(user_specs.positions_json, "[0, 2]")
+        self.assertIs(catalog.for_author("jose garcia"), user_specs)
+
+        self.assertEqual(catalog.for_author("Unknown user").specs, ())
+
+
+class TestCatalogLoader(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "specs.json")
+
+    def write_specs(self, specs):
+        with open(self.path, "w") as f:
+            json.dump(specs, f)
+
+    def test_missing_file(self):
+        loader = CatalogLoader(self.path)
+
+        self.assertEqual(len(loader.catalog), 0)
+        self.assertFalse(loader.refresh())
+
+    def test_refresh_when_file_changes(self):
+        self.write_specs([make_spec()])
+        loader = CatalogLoader(self.path)
+        catalog = loader.catalog
+        self.assertFalse(loader.refresh())
+        self.assertIs(loader.catalog, catalog)
+
+        self.write_specs([make_spec(), make_spec(index="WD002")])
+        os.utime(self.path, ns=(0, 0))
+
+        self.assertTrue(loader.refresh())
+        self.assertEqual(len(loader.catalog), 2)
+        # Requests holding the previous catalog are unaffected
+        self.assertEqual(len(catalog), 1)
+
+    def test_keep_catalog_on_invalid_file(self):
+        self.write_specs([make_spec()])
+        loader = CatalogLoader(self.path)
+
+        with open(self.path, "w") as f:
+            f.write("[{")
+        os.utime(self.path, ns=(0, 0))
+
+        with self.assertRaises(ValueError):
+            loader.refresh()
+        self.assertEqual(len(loader.catalog), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
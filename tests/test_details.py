@@ -0,0 +1,331 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import closing
+from unittest import mock
+
+from webapp.artifacts import ArtifactStore
+from webapp.cache import SQLiteCache
+from webapp.details import SingleFlight, SpecDetails
+from webapp.warm import warm_cache
+
+DOC_HTML = """
+<html><body>
+<table>
+<tr><td>Index</td><td>WD001</td></tr>
+<tr><td>Title</td><td>{title}</td></tr>
+</table>
+<p>Spec content</p>
+</body></html>
+"""
+
+
+class FakeDrive:
+    def __init__(self):
+        self.modified_time = "2023-01-01T00:00:00.000Z"
+        self.title = "First version"
+        self.exports = 0
+        self.checks = 0
+
+    def get_file(self, file_id, fields=None):
+        self.checks += 1
+        return {"modifiedTime": self.modified_time}
+
+    def doc_html(self, document_id):
+        self.exports += 1
+        return DOC_HTML.format(title=self.title)
+
+
+class SynchronousThread:
+    def __init__(self, target, args, daemon):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.release = threading.Event()
+
+    def run_concurrently(self, function, count):
+        """
+        Call `function` in `count` threads, returning once all the calls
+        are made and `function` is released
+        """
+        results = []
+
+        def call():
+            try:
+                results.append(self.flight.run("doc", function))
+            except BaseException as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        while self.flight.originated + self.flight.coalesced < count:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_coalesces_concurrent_calls(self):
+        def fetch():
+            self.release.wait()
+            return object()
+
+        results = self.run_concurrently(fetch, 5)
+
+        self.assertEqual(
+            (self.flight.originated, self.flight.coalesced), (1, 4)
+        )
+        self.assertTrue(all(result is results[0] for result in results))
+        # Not kept once done
+        self.assertIsNot(self.flight.run("doc", object), results[0])
+
+    def test_errors_are_shared_but_not_kept(self):
+        error = Exception("Export failed")
+
+        def fetch():
+            self.release.wait()
+            raise error
+
+        results = self.run_concurrently(fetch, 3)
+
+        self.assertEqual(results, [error] * 3)
+        self.assertEqual(self.flight.run("doc", lambda: "ok"), "ok")
+
+    def test_killed_call_releases_waiters(self):
+        class Killed(BaseException):
+            pass
+
+        error = Killed()
+
+        def fetch():
+            self.release.wait()
+            raise error
+
+        results = self.run_concurrently(fetch, 3)
+
+        # Only the killed call gets its exception
+        self.assertEqual(results.count(error), 1)
+        waiters = [result for result in results if result is not error]
+        self.assertEqual(len(waiters), 2)
+        for result in waiters:
+            self.assertIsInstance(result, RuntimeError)
+            self.assertIs(result.__cause__, error)
+        self.assertEqual(self.flight.run("doc", lambda: "ok"), "ok")
+
+
+class TestSQLiteCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cache.sqlite")
+
+    def test_get_and_set(self):
+        cache = SQLiteCache(self.path, max_size=1000)
+        self.assertIsNone(cache.get("doc"))
+
+        cache.set("doc", "2023-01-01", b"payload")
+        entry = cache.get("doc")
+
+        self.assertEqual(entry.modified_time, "2023-01-01")
+        self.assertEqual(entry.payload, b"payload")
+        # Shared with other processes through the database file
+        self.assertEqual(
+            SQLiteCache(self.path, max_size=1000).get("doc"), entry
+        )
+
+    def test_evicts_least_recently_used(self):
+        cache = SQLiteCache(self.path, max_size=25)
+        with mock.patch("time.time", return_value=1000):
+            cache.set("first", "1", b"x" * 10)
+        with mock.patch("time.time", return_value=1001):
+            cache.set("second", "1", b"x" * 10)
+        with mock.patch("time.time", return_value=1100):
+            cache.get("first")
+
+            cache.set("third", "1", b"x" * 10)
+
+        self.assertIsNotNone(cache.get("first"))
+        self.assertIsNone(cache.get("second"))
+        self.assertIsNotNone(cache.get("third"))
+
+    def test_hits_rarely_write(self):
+        cache = SQLiteCache(self.path, max_size=1000)
+        with mock.patch("time.time", return_value=1000):
+            cache.set("doc", "1", b"payload")
+
+        def accessed_at():
+            with closing(sqlite3.connect(self.path)) as connection:
+                return connection.execute(
+                    "SELECT accessed_at FROM details"
+                ).fetchone()[0]
+
+        with mock.patch("time.time", return_value=1030):
+            cache.get("doc")
+        self.assertEqual(accessed_at(), 1000)
+
+        with mock.patch("time.time", return_value=1100):
+            cache.get("doc")
+        self.assertEqual(accessed_at(), 1100)
+
+
+class TestSpecDetails(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.drive = FakeDrive()
+        self.cache = SQLiteCache(
+            os.path.join(directory.name, "cache.sqlite"), max_size=10**6
+        )
+        self.artifacts = ArtifactStore(
+            os.path.join(directory.name, "artifacts")
+        )
+        patcher = mock.patch(
+            "webapp.details.threading.Thread", SynchronousThread
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fetches_once(self):
+        details = SpecDetails(self.drive, self.cache, revalidate_after=60)
+
+        first = details.get("doc")
+        second = details.get("doc")
+
+        self.assertEqual(self.drive.exports, 1)
+        self.assertEqual(first.payload, second.payload)
+        payload = json.loads(first.payload)
+        self.assertEqual(payload["metadata"]["title"], "First version")
+        self.assertEqual(
+            payload["url"], "https://docs.google.com/document/d/doc"
+        )
+        self.assertIn("Spec content", payload["html"])
+
+    def test_serves_stale_while_revalidating(self):
+        details = SpecDetails(self.drive, self.cache, revalidate_after=-1)
+        details.get("doc")
+
+        # Not modified: only checked
+        details.get("doc")
+        self.assertEqual(self.drive.exports, 1)
+
+        self.drive.modified_time = "2023-02-01T00:00:00.000Z"
+        self.drive.title = "Second version"
+        stale = details.get("doc")
+        fresh = details.get("doc")
+
+        self.assertEqual(self.drive.exports, 2)
+        self.assertEqual(
+            json.loads(stale.payload)["metadata"]["title"], "First version"
+        )
+        self.assertEqual(
+            json.loads(fresh.payload)["metadata"]["title"], "Second version"
+        )
+
+    def test_modified_time(self):
+        details = SpecDetails(self.drive, self.cache, revalidate_after=60)
+        details.get("doc")
+        checks = self.drive.checks
+
+        # Checked recently: from the cache
+        self.assertEqual(
+            details.modified_time("doc"), "2023-01-01T00:00:00.000Z"
+        )
+        self.assertEqual(self.drive.checks, checks)
+
+        # Otherwise from the metadata, without exporting the document
+        self.drive.modified_time = "2023-02-01T00:00:00.000Z"
+        self.assertEqual(
+            details.modified_time("other"), "2023-02-01T00:00:00.000Z"
+        )
+        self.assertEqual(self.drive.checks, checks + 1)
+        self.assertEqual(self.drive.exports, 1)
+
+    def test_serves_prerendered_documents(self):
+        self.artifacts.put(
+            "doc", self.drive.modified_time, b'{"html": "prerendered"}'
+        )
+        details = SpecDetails(
+            self.drive,
+            self.cache,
+            revalidate_after=60,
+            artifacts=self.artifacts,
+        )
+
+        entry = details.get("doc")
+
+        self.assertEqual(self.drive.exports, 0)
+        self.assertEqual(entry.payload, b'{"html": "prerendered"}')
+        self.assertEqual(entry.modified_time, self.drive.modified_time)
+        self.assertEqual(self.cache.get("doc").payload, entry.payload)
+
+    def test_revalidates_from_prerendered_documents(self):
+        details = SpecDetails(
+            self.drive,
+            self.cache,
+            revalidate_after=-1,
+            artifacts=self.artifacts,
+        )
+        details.get("doc")
+
+        self.drive.modified_time = "2023-02-01T00:00:00.000Z"
+        self.artifacts.put(
+            "doc", self.drive.modified_time, b'{"html": "prerendered"}'
+        )
+        details.get("doc")
+
+        self.assertEqual(self.drive.exports, 1)
+        self.assertEqual(
+            details.get("doc").payload, b'{"html": "prerendered"}'
+        )
+
+    def test_warm_cache(self):
+        details = SpecDetails(self.drive, self.cache, revalidate_after=60)
+        # The pool of warm_cache needs real threads
+        mock.patch.stopall()
+
+        with mock.patch("builtins.print"):
+            warm_cache(details, ["doc", "other"], workers=2, rate=0)
+
+        self.assertEqual(self.drive.exports, 2)
+        self.assertIsNotNone(self.cache.get("other"))
+
+        # Up to date documents are left as they are
+        with mock.patch("builtins.print"):
+            warm_cache(details, ["doc"], workers=1, rate=0)
+        self.assertEqual(self.drive.exports, 2)
+
+
+class TestArtifactStore(unittest.TestCase):
+    def test_put_and_get(self):
+        with tempfile.TemporaryDirectory() as directory:
+            artifacts = ArtifactStore(directory)
+            self.assertFalse(artifacts.exists("doc"))
+            self.assertIsNone(artifacts.get("doc"))
+
+            artifacts.put("doc", "2023-01-01", b'{"html": "\n"}')
+
+            self.assertTrue(artifacts.exists("doc"))
+            entry = artifacts.get("doc")
+            self.assertEqual(entry.modified_time, "2023-01-01")
+            self.assertEqual(entry.payload, b'{"html": "\n"}')
+
+    def test_invalid_document_id(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                ArtifactStore(directory).get("../doc")
+
+
+if __name__ == "__main__":
+    unittest.main()
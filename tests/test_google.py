@@ -0,0 +1,415 @@
+import io
+import unittest
+from contextlib import contextmanager
+from unittest import mock
+
+import httplib2
+from googleapiclient.errors import HttpError
+from requests.models import Response
+
+from webapp.google import Drive, GoogleClients, RowBuffer, Sheets
+
+
+class FakeClients:
+    def __init__(self, service, session=None):
+        self.fake_service = service
+        self.fake_session = session
+
+    def service(self, name, version):
+        return self.fake_service
+
+    def session(self):
+        return self.fake_session
+
+    @contextmanager
+    def http(self):
+        yield None
+
+
+class FakeCommentsList:
+    def __init__(self, fileId, fields, pageSize, pageToken):
+        self.file_id = fileId
+        self.page_token = pageToken
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.calls = []
+
+    def add(self, request, request_id):
+        self.calls.append((request, request_id))
+
+    def execute(self, http=None):
+        self.service.batches.append(len(self.calls))
+        if self.service.batch_errors:
+            raise self.service.batch_errors.pop(0)
+        for request, request_id in self.calls:
+            pages = self.service.comments_by_file[request.file_id]
+            response = pages.get(request.page_token)
+            if isinstance(response, Exception):
+                if "retry" in pages:
+                    # Fail only once
+                    pages[request.page_token] = pages.pop("retry")
+                self.callback(request_id, None, response)
+            else:
+                self.callback(request_id, response, None)
+
+
+class FakeDriveService:
+    def __init__(self, comments_by_file):
+        # {file ID: {page token: response}}
+        self.comments_by_file = comments_by_file
+        self.batches = []
+        # Errors of the next batch requests
+        self.batch_errors = []
+
+    def comments(self):
+        return mock.Mock(list=FakeCommentsList)
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+
+def http_error(status):
+    return HttpError(httplib2.Response({"status": status}), b"")
+
+
+class FakeSheets:
+    def __init__(self):
+        self.requests = []
+
+    def insert_rows(self, rows, range):
+        self.requests.append((range, rows))
+
+
+class TestRowBuffer(unittest.TestCase):
+    def test_flushes_in_chunks(self):
+        sheets = FakeSheets()
+        rows = RowBuffer(sheets, range="Specs_tmp", chunk_size=2)
+
+        for i in range(5):
+            rows.append([i])
+        self.assertEqual(len(sheets.requests), 2)
+
+        rows.flush()
+        rows.flush()
+        self.assertEqual(
+            sheets.requests,
+            [
+                ("Specs_tmp", [[0], [1]]),
+                ("Specs_tmp", [[2], [3]]),
+                ("Specs_tmp", [[4]]),
+            ],
+        )
+
+
+class FakeFilesList:
+    def __init__(self, service, kwargs):
+        self.service = service
+        self.kwargs = kwargs
+
+    def execute(self, http=None, num_retries=0):
+        self.service.queries.append(self.kwargs)
+        pages = self.service.pages
+        page = pages.index(self.kwargs["pageToken"])
+        files = [
+            file
+            for file in self.service.files_by_page[page]
+            if not file.get("parents")
+            or any(
+                f"'{p}' in parents" in self.kwargs["q"]
+                for p in file["parents"]
+            )
+        ]
+        response = {"files": files}
+        if page + 1 < len(pages):
+            response["nextPageToken"] = pages[page + 1]
+        return response
+
+
+class FakeFilesService:
+    def __init__(self, files_by_page):
+        self.files_by_page = files_by_page
+        self.pages = [None] + [
+            f"page-{i}" for i in range(1, len(files_by_page))
+        ]
+        self.queries = []
+
+    def files(self):
+        return mock.Mock(list=lambda **kwargs: FakeFilesList(self, kwargs))
+
+
+class TestGetFiles(unittest.TestCase):
+    def test_follows_pages(self):
+        drive = Drive(
+            FakeClients(FakeFilesService([[{"id": "1"}], [{"id": "2"}]]))
+        )
+
+        files = drive.get_files(query="trashed = false", fields=("id",))
+
+        self.assertEqual(files, [{"id": "1"}, {"id": "2"}])
+        self.assertEqual(
+            [q["pageToken"] for q in drive.service.queries], [None, "page-1"]
+        )
+        self.assertEqual(
+            drive.service.queries[0]["fields"], "nextPageToken,files(id)"
+        )
+
+    def test_files_in_folders(self):
+        drive = Drive(
+            FakeClients(
+                FakeFilesService(
+                    [
+                        [
+                            {"id": "1", "parents": ["a"]},
+                            {"id": "2", "parents": ["c"]},
+                        ]
+                    ]
+                )
+            )
+        )
+
+        with mock.patch("webapp.google.MAX_QUERY_LENGTH", 40):
+            files = drive.get_files_in_folders(
+                folder_ids=["a", "b", "c"], query="trashed = false", fields=[]
+            )
+
+        self.assertEqual(
+            [q["q"] for q in drive.service.queries],
+            [
+                "(trashed = false) and ('a' in parents or 'b' in parents)",
+                "(trashed = false) and ('c' in parents)",
+            ],
+        )
+        self.assertEqual(
+            files,
+            {
+                "a": [{"id": "1", "parents": ["a"]}],
+                "b": [],
+                "c": [{"id": "2", "parents": ["c"]}],
+            },
+        )
+
+
+class TestGetCommentsBulk(unittest.TestCase):
+    def test_counts_all_pages(self):
+        service = FakeDriveService(
+            {
+                "paginated": {
+                    None: {
+                        "comments": [{"resolved": False}] * 100,
+                        "nextPageToken": "page-2",
+                    },
+                    "page-2": {"comments": [{"resolved": True}] * 20},
+                },
+                "no-comments": {None: {}},
+                "rate-limited": {
+                    None: http_error(429),
+                    "retry": {"comments": [{"resolved": False}]},
+                },
+                "missing": {None: http_error(404)},
+            }
+        )
+        drive = Drive(FakeClients(service))
+
+        with mock.patch("webapp.google.time.sleep") as sleep:
+            counts = drive.get_comments_bulk(
+                ["paginated", "no-comments", "rate-limited", "missing"]
+            )
+
+        self.assertEqual(
+            counts,
+            {
+                "paginated": {"numberOfComments": 120, "openComments": 100},
+                "no-comments": {"numberOfComments": 0, "openComments": 0},
+                "rate-limited": {"numberOfComments": 1, "openComments": 1},
+            },
+        )
+        self.assertEqual(drive.service.batches, [4, 2])
+        sleep.assert_called_once()
+
+    def test_retries_failed_batches(self):
+        service = FakeDriveService({"doc": {None: {}}, "other": {None: {}}})
+        service.batch_errors = [http_error(503)]
+        drive = Drive(FakeClients(service))
+
+        with mock.patch("webapp.google.time.sleep") as sleep:
+            counts = drive.get_comments_bulk(["doc", "other"])
+
+        self.assertEqual(list(counts), ["doc", "other"])
+        self.assertEqual(service.batches, [2, 2])
+        sleep.assert_called_once()
+
+        # Files of batches that keep failing are left out
+        service.batch_errors = [http_error(400)]
+        self.assertEqual(drive.get_comments_bulk(["doc", "other"]), {})
+
+
+class TestGoogleClients(unittest.TestCase):
+    def test_shares_credentials_and_transports(self):
+        clients = GoogleClients()
+        clients.credentials = mock.Mock(valid=False)
+
+        def refresh(request):
+            clients.credentials.valid = True
+
+        clients.credentials.refresh.side_effect = refresh
+
+        with clients.http() as http:
+            # Another request at the same time gets its own transport
+            with clients.http() as other_http:
+                self.assertIsNot(other_http, http)
+        # The transport used last is reused first, its connections are
+        # the most likely to still be open
+        with clients.http() as reused_http:
+            self.assertIs(reused_http, http)
+
+        clients.credentials.refresh.assert_called_once()
+        # Transports time out, as those of googleapiclient
+        self.assertEqual(http.http.timeout, 60)
+        self.assertNotIn(308, http.http.redirect_codes)
+        (request,), _ = clients.credentials.refresh.call_args
+        self.assertEqual(request.http.timeout, 60)
+
+
+class FakeSpreadsheets:
+    """
+    Spreadsheets service holding a sheet of `row_count` rows, whose
+    cells are their row number
+    """
+
+    def __init__(self, row_count):
+        self.row_count = row_count
+        self.ranges = []
+
+    def get(self, spreadsheetId, fields, ranges=None, includeGridData=False):
+        if not ranges:
+            properties = {
+                "title": "Specs",
+                "gridProperties": {"rowCount": self.row_count},
+            }
+            response = {"sheets": [{"properties": properties}]}
+        else:
+            self.ranges.extend(ranges)
+            start, end = ranges[0].split("!A")[1].split(":M")
+            rows = [
+                {"values": [{"formattedValue": str(row)}]}
+                for row in range(int(start), int(end) + 1)
+            ]
+            response = {"sheets": [{"data": [{"rowData": rows}]}]}
+        return mock.Mock(execute=lambda http, num_retries: response)
+
+
+class TestIterRows(unittest.TestCase):
+    def test_pages(self):
+        spreadsheets = FakeSpreadsheets(row_count=10)
+        sheets = Sheets(
+            "spreadsheet",
+            FakeClients(mock.Mock(spreadsheets=lambda: spreadsheets)),
+        )
+
+        rows = sheets.iter_rows(
+            "Specs",
+            columns="A:M",
+            first_row=2,
+            fields="formattedValue",
+            page_size=4,
+            workers=2,
+        )
+
+        self.assertEqual(
+            [row["values"][0]["formattedValue"] for row in rows],
+            [str(row) for row in range(2, 11)],
+        )
+        self.assertEqual(
+            sorted(spreadsheets.ranges),
+            ["Specs!A10:M10", "Specs!A2:M5", "Specs!A6:M9"],
+        )
+
+
+class FakeBody(io.BytesIO):
+    """
+    Response body counting the bytes read from it
+    """
+
+    def __init__(self, content):
+        super().__init__(content)
+        self.read_size = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.read_size += len(data)
+        return data
+
+
+class FakeSession:
+    """
+    Requests session streaming `html` as the export of documents
+    """
+
+    def __init__(self, html, headers=None, statuses=()):
+        self.html = html
+        self.headers = headers or {}
+        self.statuses = list(statuses)
+        self.body = None
+
+    def get(self, url, params, stream, timeout):
+        response = Response()
+        response.status_code = self.statuses.pop(0) if self.statuses else 200
+        response.headers.update(self.headers)
+        response.raw = self.body = FakeBody(self.html)
+        return response
+
+
+class TestDocHtml(unittest.TestCase):
+    def setUp(self):
+        self.html = b"<p>Caf\xc3\xa9</p>" * 100
+        self.session = FakeSession(self.html)
+        self.drive = Drive(FakeClients(mock.Mock(), self.session))
+
+    def test_chunks(self):
+        chunks = list(self.drive.doc_html_chunks("doc", chunk_size=64))
+
+        self.assertEqual(b"".join(chunks), self.html)
+        self.assertEqual(len(chunks[0]), 64)
+        self.assertEqual(self.drive.doc_html("doc"), self.html)
+
+    def test_stops_early(self):
+        chunks = self.drive.doc_html_chunks("doc", chunk_size=64)
+        next(chunks)
+        chunks.close()
+
+        # The rest of the export isn't read
+        self.assertEqual(self.session.body.read_size, 64)
+        self.assertTrue(self.session.body.closed)
+
+    def test_max_size(self):
+        with self.assertRaises(ValueError):
+            self.drive.doc_html("doc", chunk_size=64, max_size=1000)
+        # Stopped once over the limit
+        self.assertEqual(self.session.body.read_size, 1024)
+
+        chunks = self.drive.doc_html_chunks("doc", chunk_size=64, max_size=100)
+        self.assertEqual(len(next(chunks)), 64)
+        with self.assertRaises(ValueError):
+            next(chunks)
+
+    def test_max_content_length(self):
+        self.session.headers["Content-Length"] = str(len(self.html))
+
+        with self.assertRaises(ValueError):
+            self.drive.doc_html("doc", max_size=1000)
+        self.assertEqual(self.session.body.read_size, 0)
+
+    def test_retries(self):
+        self.session.statuses = [503, 429]
+
+        with mock.patch("time.sleep") as sleep:
+            self.assertEqual(self.drive.doc_html("doc"), self.html)
+        self.assertEqual(sleep.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from unittest import mock
+
+from webapp import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_timed(self):
+        def render(document_id):
+            return document_id.upper()
+
+        with mock.patch.object(metrics.stage_latency, "observe") as observe:
+            timed_render = metrics.timed("render")(render)
+            self.assertEqual(timed_render("doc"), "DOC")
+        self.assertIsNot(timed_render, render)
+        observe.assert_called_once_with(mock.ANY, stage="render")
+
+    def test_disabled(self):
+        def render(document_id):
+            return document_id
+
+        with mock.patch.object(
+            metrics, "METRICS_ENABLED", False
+        ), mock.patch.object(metrics.stage_latency, "observe") as observe:
+            self.assertIs(metrics.timed("render")(render), render)
+            with metrics.timer("render"):
+                pass
+            metrics.count(metrics.errors, stage="render")
+        observe.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,21 @@
+import gzip
+import json
+import os
+import tempfile
 import unittest
-from webapp.app import app
+from unittest import mock
+
+from talisker.endpoints import StandardEndpointMiddleware
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from webapp.app import app, assets, catalog_loader
+from webapp.cache import SQLiteCache
+from webapp.catalog import Catalog
+from webapp.details import SpecDetails
+
+from tests.test_catalog import make_spec
+from tests.test_details import FakeDrive
 
 
 class TestRoutes(unittest.TestCase):
@@ -32,6 +48,233 @@ class TestRoutes(unittest.TestCase):
 
         self.assertEqual(self.client.get("/not-found-url").status_code, 404)
 
+    def test_search_specs(self):
+        """
+        When searching the specs, we should return the matching ones,
+        and a 400 status code for invalid queries
+        """
+        catalog = Catalog(
+            [make_spec(), make_spec(index="WD002", status="Approved")]
+        )
+
+        with mock.patch.object(catalog_loader, "catalog", catalog):
+            response = self.client.get(
+                "/api/specs?q=test&team=all&status=approved"
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json["total"], 1)
+            self.assertEqual(response.json["specs"][0]["index"], "WD002")
+
+            response = self.client.get("/api/specs?sortBy=unknown")
+            self.assertEqual(response.status_code, 400)
+
+    def test_catalog_json(self):
+        """
+        The catalog should be sent gzipped to the clients accepting it,
+        with an ETag for each variant, and cached for good only when
+        requested for its current version
+        """
+        catalog = Catalog([make_spec()])
+        version = catalog.version
+
+        with mock.patch.object(catalog_loader, "catalog", catalog):
+            response = self.client.get(
+                "/catalog.json", headers={"Accept-Encoding": "gzip"}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertEqual(response.headers["ETag"], f'"{version}-gzip"')
+            self.assertIn("Accept-Encoding", response.headers["Vary"])
+            self.assertEqual(
+                json.loads(gzip.decompress(response.data)),
+                json.loads(catalog.payload),
+            )
+
+            response = self.client.get("/catalog.json")
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("Content-Encoding", response.headers)
+            self.assertEqual(response.headers["ETag"], f'"{version}"')
+            self.assertIn("Accept-Encoding", response.headers["Vary"])
+            self.assertEqual(response.data, catalog.payload)
+
+            for etag in [f'"{version}"', f'"{version}-gzip"']:
+                response = self.client.get(
+                    "/catalog.json",
+                    headers={
+                        "Accept-Encoding": "gzip" if "gzip" in etag else "",
+                        "If-None-Match": etag,
+                    },
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_catalog_json_cache_control(self):
+        """
+        The catalog should only be immutable at the URL of its current
+        version, including once the SSO headers are added
+        """
+        catalog = Catalog([make_spec()])
+
+        with mock.patch.object(catalog_loader, "catalog", catalog):
+            for url, cache_control in [
+                (
+                    f"/catalog.json?v={catalog.version}",
+                    "private, max-age=31536000, immutable",
+                ),
+                ("/catalog.json?v=outdated", "private, no-cache"),
+                ("/catalog.json", "private, no-cache"),
+            ]:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response.headers["Cache-Control"], cache_control
+                )
+
+    def test_my_specs(self):
+        """
+        The page of the specs of the user should embed their positions in
+        the catalog, and link to the current version of the catalog
+        """
+        catalog = Catalog(
+            [
+                make_spec(fileID="1", authors="Jane Doe"),
+                make_spec(fileID="2", authors="Test user"),
+            ]
+        )
+        user_specs = catalog.for_author("Test user")
+        self.assertNotEqual(user_specs.positions_json, "[]")
+
+        with mock.patch.object(catalog_loader, "catalog", catalog):
+            response = self.client.get("/my-specs")
+
+        self.assertEqual(response.status_code, 200)
+        page = response.data.decode()
+        self.assertIn(f"const positions = {user_specs.positions_json};", page)
+        self.assertIn(f"/catalog.json?v={catalog.version}", page)
+
+    def test_metrics(self):
+        """
+        The timings of the views should be published with the metrics of
+        talisker, as in production (where it wraps the app)
+        """
+        self.client.get("/api/specs")
+
+        response = Client(StandardEndpointMiddleware(app), Response).get(
+            "/_status/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'specs_stage_latency_count{stage="view_search_specs"}',
+            response.data.decode(),
+        )
+
+    def test_search_content_limit(self):
+        """
+        The number of full-text results should be between 1 and 100
+        """
+        fulltext = mock.Mock(search=mock.Mock(return_value=[]))
+
+        with mock.patch("webapp.app.fulltext", fulltext):
+            for limit, expected in [("-1", 1), ("0", 1), ("500", 100)]:
+                response = self.client.get(f"/api/search?q=snap&limit={limit}")
+                self.assertEqual(response.status_code, 200)
+                fulltext.search.assert_called_with("snap", limit=expected)
+
+    def spec_details(self, drive):
+        """
+        Serve the documents of `drive` from an empty cache
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = SQLiteCache(
+            os.path.join(directory.name, "cache.sqlite"), max_size=10**6
+        )
+        details = SpecDetails(drive, cache, revalidate_after=60)
+        patcher = mock.patch("webapp.app.spec_details", details)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_spec_details_validators(self):
+        """
+        Documents should be identified by their Drive modifiedTime, and
+        revalidated by browsers on every use
+        """
+        drive = FakeDrive()
+        self.spec_details(drive)
+
+        response = self.client.get("/spec-details/doc")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["metadata"]["title"], "First version")
+        self.assertEqual(
+            response.headers["ETag"], '"2023-01-01T00:00:00.000Z"'
+        )
+        self.assertEqual(
+            response.headers["Last-Modified"], "Sun, 01 Jan 2023 00:00:00 GMT"
+        )
+        self.assertEqual(
+            response.headers["Cache-Control"], "private, no-cache"
+        )
+
+    def test_spec_details_not_modified(self):
+        """
+        Conditional requests for unchanged documents should get a 304,
+        checking the version of the document without exporting it
+        """
+        drive = FakeDrive()
+        self.spec_details(drive)
+
+        for headers in [
+            {"If-None-Match": '"2023-01-01T00:00:00.000Z"'},
+            {"If-Modified-Since": "Sun, 01 Jan 2023 00:00:00 GMT"},
+        ]:
+            response = self.client.get("/spec-details/doc", headers=headers)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(
+                response.headers["ETag"], '"2023-01-01T00:00:00.000Z"'
+            )
+        self.assertEqual(drive.checks, 2)
+        self.assertEqual(drive.exports, 0)
+
+        # Modified documents are sent in full
+        drive.modified_time = "2023-02-01T00:00:00.000Z"
+        drive.title = "Second version"
+        response = self.client.get(
+            "/spec-details/doc",
+            headers={"If-None-Match": '"2023-01-01T00:00:00.000Z"'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["metadata"]["title"], "Second version")
+        self.assertEqual(
+            response.headers["ETag"], '"2023-02-01T00:00:00.000Z"'
+        )
+        self.assertEqual(drive.exports, 1)
+
+    def test_spec_asset(self):
+        """
+        Images of the documents should be served with immutable cache
+        headers, and support range requests
+        """
+        name = assets.put(b"GIF89a image", "image/gif")
+
+        response = self.client.get(f"/spec-asset/{name}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "image/gif")
+        self.assertEqual(
+            response.headers["Cache-Control"],
+            "private, max-age=31536000, immutable",
+        )
+
+        response = self.client.get(
+            f"/spec-asset/{name}", headers={"Range": "bytes=0-5"}
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, b"GIF89a")
+
+        self.assertEqual(self.client.get("/spec-asset/..").status_code, 404)
+        self.assertEqual(
+            self.client.get(f"/spec-asset/{'0' * 64}.png").status_code, 404
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+
+from webapp.catalog import Catalog
+from webapp.fulltext import FullTextIndex
+from webapp.search import SearchQuery
+
+from tests.test_catalog import make_spec
+
+
+class TestSpecIndex(unittest.TestCase):
+    def setUp(self):
+        catalog = Catalog(
+            [
+                make_spec(
+                    index="WD001",
+                    title="Ubuntu website",
+                    folderName="Web",
+                    authors="José García",
+                    lastUpdated="01 Feb 2023",
+                ),
+                make_spec(
+                    index="DT002",
+                    title="Desktop installer",
+                    folderName="Desktop",
+                    status="Approved",
+                    type="Process",
+                    lastUpdated="01 Mar 2023",
+                ),
+                make_spec(
+                    index="WD003",
+                    title="Charmhub",
+                    folderName="Web",
+                    status="Approved",
+                    lastUpdated="01 Jan 2023",
+                ),
+            ]
+        )
+        self.index = catalog.search_index
+
+    def search(self, **kwargs):
+        result = self.index.search(SearchQuery(**kwargs))
+        return [spec["index"] for spec in result["specs"]]
+
+    def test_text(self):
+        self.assertEqual(self.search(text="ubu"), ["WD001"])
+        self.assertEqual(self.search(text="jose"), ["WD001"])
+        self.assertEqual(self.search(text="web charm"), ["WD003"])
+        self.assertEqual(self.search(text="nothing"), [])
+
+    def test_filters(self):
+        self.assertEqual(self.search(team="web"), ["WD001", "WD003"])
+        self.assertEqual(
+            self.search(statuses=["approved", "drafting"], types=["process"]),
+            ["DT002"],
+        )
+        self.assertEqual(self.search(author="Jose Garcia"), ["WD001"])
+        self.assertEqual(
+            self.search(team="web", statuses=["Approved"]), ["WD003"]
+        )
+
+    def test_sort_and_pages(self):
+        self.assertEqual(self.search(), ["DT002", "WD001", "WD003"])
+        self.assertEqual(
+            self.search(sort_by="name"), ["WD003", "DT002", "WD001"]
+        )
+        self.assertEqual(
+            self.search(sort_by="index", page=2, per_page=2), ["WD003"]
+        )
+
+    def test_cached_per_normalized_query(self):
+        result = self.index.search(SearchQuery(statuses=["a", "B"]))
+
+        self.assertIs(
+            self.index.search(SearchQuery(statuses=["b", "A", "a"])), result
+        )
+
+    def test_invalid_query(self):
+        with self.assertRaises(ValueError):
+            SearchQuery(sort_by="unknown")
+        with self.assertRaises(ValueError):
+            SearchQuery(page=0)
+
+
+class TestFullTextIndex(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.index = FullTextIndex(os.path.join(directory.name, "index.db"))
+        self.index.create()
+        self.index.update(
+            [
+                ("1", "2023-01-01", "Snap store", "Publishing <snaps> fast"),
+                ("2", "2023-01-01", "Charms", "Charms can publish snaps"),
+            ]
+        )
+
+    def test_search(self):
+        results = self.index.search("snap")
+
+        self.assertEqual([r["fileID"] for r in results], ["1", "2"])
+        self.assertEqual(
+            results[0]["snippet"], "Publishing &lt;<mark>snaps</mark>&gt; fast"
+        )
+        self.assertEqual(self.index.search('"snap* (:'), results)
+        self.assertEqual(self.index.search(""), [])
+
+    def test_update(self):
+        self.index.update(
+            [("1", "2023-02-01", "Snap store", "Rewritten")], keep=["1"]
+        )
+
+        self.assertEqual(self.index.versions(), {"1": "2023-02-01"})
+        self.assertEqual(self.index.search("publishing"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
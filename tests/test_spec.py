@@ -0,0 +1,195 @@
+import base64
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from requests import Response
+
+from webapp.assets import AssetStore, load_image
+from webapp.spec import Spec, first_table_html
+
+DOC_HTML = """
+<html>
+<head>
+<meta content="text/html; charset=UTF-8" http-equiv="content-type">
+<style type="text/css">.c1{font-weight:700}</style>
+</head>
+<body class="c5 doc-content">
+<table class="c2">
+<tr><td class="c3"><p><span>Index</span></p></td><td>WD001</td></tr>
+<tr><td>Title</td><td>Test spec</td></tr>
+<tr><td>Status</td><td>Drafting</td></tr>
+<tr>
+<td>Authors</td>
+<td><p><span>Jane Doe</span><span>,</span><span>John Doe</span></p></td>
+</tr>
+<tr><td>Type</td><td>Standard</td></tr>
+</table>
+<h1 class="c4" id="h.abc"><span class="c1">Abstract</span></h1>
+<p class="c6" style="margin: 0"><span class="c1">Some text</span><span></span></p>
+<p><span><span><span class="c7"> </span></span></span></p>
+<p><span><br></span></p>
+<p><span>Line</span><br><span>break</span></p>
+<p><span>Image</span><img src="image.png" style="width: 10px"></p>
+<p class="c6"><span class="c7"><img src="photo.png" style="width: 20px"></span></p>
+<!-- comment only -->
+<div><!-- comment --></div>
+</body>
+</html>
+"""
+
+
+class TestSpec(unittest.TestCase):
+    def setUp(self):
+        self.spec = Spec(
+            google_drive=None, document_id="doc", raw_html=DOC_HTML
+        )
+
+    def test_metadata(self):
+        self.assertEqual(self.spec.metadata["index"], "WD001")
+        self.assertEqual(self.spec.metadata["title"], "Test spec")
+        self.assertEqual(self.spec.metadata["status"], "Drafting")
+        self.assertEqual(
+            self.spec.metadata["authors"], ["Jane Doe", "John Doe"]
+        )
+        self.assertEqual(self.spec.metadata["type"], "Standard")
+
+    def test_clean(self):
+        self.assertEqual(
+            str(self.spec.html).replace("\n", ""),
+            "<html><body>"
+            '<h1 id="h.abc"><span>Abstract</span></h1>'
+            "<p><span>Some text</span></p>"
+            "<p><span>Line</span><br/><span>break</span></p>"
+            '<p><span>Image</span><img src="image.png" style="width: 10px"/>'
+            "</p>"
+            '<p><span><img src="photo.png" style="width: 20px"/></span></p>'
+            "<!-- comment only -->"
+            "</body></html>",
+        )
+
+    def test_utf8_bytes(self):
+        spec = Spec(None, document_id="doc", raw_html=DOC_HTML.encode())
+
+        self.assertEqual(spec.metadata, self.spec.metadata)
+        self.assertEqual(str(spec.html), str(self.spec.html))
+
+    def test_extract_images(self):
+        image = b"\x89PNG image"
+        data_uri = f"data:image/png;base64,{base64.b64encode(image).decode()}"
+        # Google Docs exports images in paragraphs without text
+        html = DOC_HTML.replace('src="photo.png"', f'src="{data_uri}"')
+
+        with tempfile.TemporaryDirectory() as directory:
+            assets = AssetStore(directory)
+            spec = Spec(None, document_id="doc", raw_html=html, assets=assets)
+
+            name = os.listdir(directory)[0]
+            self.assertEqual(
+                spec.html.select("img")[1]["src"], f"/spec-asset/{name}"
+            )
+            with open(assets.path(name), "rb") as f:
+                self.assertEqual(f.read(), image)
+        # Other images are left as they are
+        self.assertEqual(self.spec.html.select_one("img")["src"], "image.png")
+
+
+class FakeBody(io.BytesIO):
+    """
+    Response body counting the bytes read from it
+    """
+
+    def __init__(self, content):
+        super().__init__(content)
+        self.read_size = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.read_size += len(data)
+        return data
+
+
+class TestLoadImage(unittest.TestCase):
+    src = "https://lh3.googleusercontent.com/image"
+
+    def response(self, content, headers=None):
+        response = Response()
+        response.status_code = 200
+        response.headers.update(
+            {"Content-Type": "image/png", **(headers or {})}
+        )
+        response.raw = FakeBody(content)
+        return response
+
+    def test_download(self):
+        with mock.patch(
+            "webapp.assets.requests.get",
+            return_value=self.response(b"\x89PNG image"),
+        ) as get:
+            self.assertEqual(
+                load_image(self.src), (b"\x89PNG image", "image/png")
+            )
+        get.assert_called_once_with(self.src, stream=True, timeout=10)
+
+    def test_max_size(self):
+        response = self.response(b"x" * 1024 * 1024)
+        with mock.patch("webapp.assets.requests.get", return_value=response):
+            self.assertIsNone(load_image(self.src, max_size=100))
+        # Stopped reading once the limit was reached
+        self.assertLess(response.raw.read_size, 1024 * 1024)
+
+        response = self.response(b"x" * 10, {"Content-Length": "1000"})
+        with mock.patch("webapp.assets.requests.get", return_value=response):
+            self.assertIsNone(load_image(self.src, max_size=100))
+        self.assertEqual(response.raw.read_size, 0)
+
+    def test_other_hosts(self):
+        with mock.patch("webapp.assets.requests.get") as get:
+            self.assertIsNone(load_image("https://example.com/image.png"))
+        get.assert_not_called()
+
+
+class FakeDrive:
+    def __init__(self, html):
+        self.html = html.encode()
+        self.downloaded = 0
+
+    def doc_html_chunks(self, document_id):
+        for i in range(0, len(self.html), 100):
+            self.downloaded += 1
+            yield self.html[i : i + 100]
+
+
+class TestMetadataOnly(unittest.TestCase):
+    def test_same_metadata(self):
+        drive = FakeDrive(DOC_HTML + "<p>More content</p>" * 1000)
+
+        spec = Spec.metadata_only(drive, "doc")
+
+        self.assertEqual(
+            spec.metadata,
+            Spec(None, document_id="doc", raw_html=DOC_HTML).metadata,
+        )
+        # Stopped after the table
+        self.assertLess(drive.downloaded, len(DOC_HTML) / 100 + 1)
+
+    def test_nested_tables(self):
+        html = (
+            "<body><table><tr><td><table><tr><td>Inner</td></tr></table>"
+            "</td></tr></table><table></table></body>"
+        )
+
+        self.assertEqual(
+            first_table_html([html[:30].encode(), html[30:].encode()]),
+            "<table><tr><td><table><tr><td>Inner</td></tr></table>"
+            "</td></tr></table>",
+        )
+
+    def test_no_table(self):
+        self.assertEqual(first_table_html([b"<p>No table</p>"]), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from webapp import update
+from webapp.artifacts import ArtifactStore
+from webapp.fulltext import FullTextIndex
+from webapp.google import RowBuffer
+from webapp.settings import SPECS_SHEET_TITLE, TMP_SHEET_TITLE
+
+DOC_HTML = """
+<html><body>
+<table>
+<tr><td>Index</td><td>{index}</td></tr>
+<tr><td>Title</td><td>{title}</td></tr>
+<tr><td>Status</td><td>Drafting</td></tr>
+<tr><td>Authors</td><td><p><span>Test user</span></p></td></tr>
+<tr><td>Type</td><td>Standard</td></tr>
+<tr><td>Created</td><td>1 Jan 2023</td></tr>
+</table>
+<p>Spec content</p>
+</body></html>
+"""
+
+
+class FakeDrive:
+    def __init__(self, folders, broken=()):
+        # {folder name: [file, ...]}
+        self.folders = folders
+        self.broken = broken
+        self.exported = []
+
+    def get_files(self, query, fields=None):
+        return [{"id": name, "name": name} for name in self.folders]
+
+    def get_files_in_folders(self, folder_ids, query, fields):
+        return {folder_id: self.folders[folder_id] for folder_id in folder_ids}
+
+    def get_comments_bulk(self, file_ids):
+        return {
+            file_id: {"numberOfComments": 2, "openComments": 1}
+            for file_id in file_ids
+        }
+
+    def doc_html(self, document_id):
+        self.exported.append(document_id)
+        if document_id in self.broken:
+            raise Exception("Export failed")
+        return DOC_HTML.format(
+            index=document_id.upper(), title=f"Title {document_id}"
+        )
+
+    def doc_html_chunks(self, document_id):
+        html = self.doc_html(document_id).encode()
+        for i in range(0, len(html), 64):
+            yield html[i : i + 64]
+
+
+class FakeSheets:
+    def __init__(self, spreadsheet_id):
+        self.rows = []
+        self.requests = 0
+        self.names = {1: SPECS_SHEET_TITLE, 2: TMP_SHEET_TITLE}
+
+    def get_sheet_by_title(self, title, ranges=None):
+        sheet_id = next(i for i, n in self.names.items() if n == title)
+        return {"properties": {"sheetId": sheet_id, "title": title}}
+
+    def clear(self, sheet_id):
+        self.rows = []
+
+    def insert_rows(self, rows, range):
+        self.requests += 1
+        self.rows.extend(rows)
+
+    def row_buffer(self, range, chunk_size=1000):
+        return RowBuffer(self, range=range, chunk_size=chunk_size)
+
+    def swap_sheet_names(self, sheet, other_sheet):
+        sheet_id = sheet["properties"]["sheetId"]
+        other_sheet_id = other_sheet["properties"]["sheetId"]
+        self.names[sheet_id], self.names[other_sheet_id] = (
+            self.names[other_sheet_id],
+            self.names[sheet_id],
+        )
+
+
+def make_file(file_id, modified="2023-01-01T00:00:00.000Z"):
+    return {
+        "id": file_id,
+        "name": f"{file_id} - Spec",
+        "createdTime": "2023-01-01T00:00:00.000Z",
+        "modifiedTime": modified,
+        "webViewLink": f"https://docs.google.com/document/d/{file_id}",
+    }
+
+
+class TestUpdateSheet(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        state_file = os.path.join(directory.name, "state.json")
+        patcher = mock.patch.object(update, "UPDATE_STATE_FILE", state_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_update(self, drive, **kwargs):
+        sheets = FakeSheets(spreadsheet_id="")
+        with mock.patch.object(
+            update, "Drive", return_value=drive
+        ), mock.patch.object(update, "Sheets", return_value=sheets):
+            update.update_sheet(**kwargs)
+        return sheets
+
+    def test_writes_rows(self):
+        drive = FakeDrive({"Web": [make_file("wd001"), make_file("wd002")]})
+
+        sheets = self.run_update(drive)
+
+        self.assertEqual(len(sheets.rows), 3)
+        self.assertEqual(sheets.requests, 1)
+        self.assertEqual(
+            sheets.rows[1],
+            [
+                "Web",
+                "wd001 - Spec",
+                "wd001",
+                "https://docs.google.com/document/d/wd001",
+                "WD001",
+                "Title wd001",
+                "Drafting",
+                "Test user",
+                "Standard",
+                "2023-01-01T00:00:00.000Z",
+                "2023-01-01T00:00:00.000Z",
+                2,
+                1,
+            ],
+        )
+        self.assertEqual(sheets.names[2], SPECS_SHEET_TITLE)
+        self.assertEqual(sheets.names[1], TMP_SHEET_TITLE)
+
+    def test_only_parses_modified_documents(self):
+        self.run_update(
+            FakeDrive({"Web": [make_file("wd001"), make_file("wd002")]})
+        )
+
+        drive = FakeDrive(
+            {
+                "Web": [
+                    make_file("wd001"),
+                    make_file("wd002", modified="2023-02-01T00:00:00.000Z"),
+                    make_file("wd003"),
+                ]
+            }
+        )
+        sheets = self.run_update(drive)
+
+        self.assertEqual(sorted(drive.exported), ["wd002", "wd003"])
+        self.assertEqual(
+            [row[4] for row in sheets.rows[1:]], ["WD001", "WD002", "WD003"]
+        )
+
+    def test_full_update(self):
+        self.run_update(FakeDrive({"Web": [make_file("wd001")]}))
+
+        drive = FakeDrive({"Web": [make_file("wd001")]})
+        self.run_update(drive, full=True)
+
+        self.assertEqual(drive.exported, ["wd001"])
+
+    def test_keeps_order_and_skips_failures(self):
+        drive = FakeDrive(
+            {
+                "Web": [make_file(f"wd{i:03}") for i in range(20)],
+                "Desktop": [make_file(f"dt{i:03}") for i in range(20)],
+            },
+            broken=("wd005", "dt010"),
+        )
+
+        with mock.patch.object(update, "UPDATE_PROCESSES", 0):
+            sheets = self.run_update(drive)
+
+        expected = [
+            (folder, f"{prefix}{i:03}")
+            for folder, prefix in (("Web", "wd"), ("Desktop", "dt"))
+            for i in range(20)
+            if f"{prefix}{i:03}" not in drive.broken
+        ]
+        self.assertEqual(
+            [(row[0], row[2]) for row in sheets.rows[1:]], expected
+        )
+
+    def test_prerenders_documents(self):
+        artifacts_dir = os.path.join(self.directory, "artifacts")
+
+        with mock.patch.object(update, "ARTIFACTS_DIR", artifacts_dir):
+            self.run_update(FakeDrive({"Web": [make_file("wd001")]}))
+            entry = ArtifactStore(artifacts_dir).get("wd001")
+            self.assertEqual(entry.modified_time, "2023-01-01T00:00:00.000Z")
+            payload = json.loads(entry.payload)
+            self.assertEqual(payload["metadata"]["index"], "WD001")
+            self.assertIn("Spec content", payload["html"])
+
+            # Unchanged but missing from the store: rendered again
+            os.remove(os.path.join(artifacts_dir, "wd001.json.gz"))
+            drive = FakeDrive({"Web": [make_file("wd001")]})
+            self.run_update(drive)
+            self.assertEqual(drive.exported, ["wd001"])
+
+    def test_indexes_documents(self):
+        index_path = os.path.join(self.directory, "index.db")
+
+        with mock.patch.object(update, "FULLTEXT_INDEX_PATH", index_path):
+            self.run_update(
+                FakeDrive({"Web": [make_file("wd001"), make_file("wd002")]})
+            )
+            results = FullTextIndex(index_path).search("spec content")
+            self.assertEqual(
+                sorted(r["fileID"] for r in results), ["wd001", "wd002"]
+            )
+
+            # Removed documents are removed from the index
+            drive = FakeDrive({"Web": [make_file("wd001")]})
+            self.run_update(drive)
+            self.assertEqual(drive.exported, [])
+            self.assertEqual(
+                FullTextIndex(index_path).versions(),
+                {"wd001": "2023-01-01T00:00:00.000Z"},
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,22 +1,49 @@
-import copy
-import json
 import os
+
+import click
 import flask
 
-from flask import render_template, jsonify, abort, redirect
+from dateutil.parser import parse
+from dateutil.tz import UTC
+from flask import render_template, abort, redirect, url_for
 from canonicalwebteam.flask_base.app import FlaskBase
 
-from cachetools import cached, TTLCache
-
-from webapp.authors import parse_authors, unify_authors
-from webapp.spec import Spec
+from webapp.artifacts import ArtifactStore
+from webapp.assets import AssetStore
+from webapp.cache import SQLiteCache
+from webapp.catalog import CatalogLoader
+from webapp.details import SpecDetails
+from webapp.fulltext import FullTextIndex
+from webapp.search import SearchQuery
 from webapp.sso import init_sso
 from webapp.update import update_sheet
+from webapp.warm import warm_cache
 from webapp.google import Drive
-
-CACHE_TTL = 60 * 30
+from webapp.metrics import count, errors, timed
+from webapp.settings import (
+    ARTIFACTS_DIR,
+    ASSETS_DIR,
+    DETAILS_CACHE_MAX_SIZE,
+    DETAILS_CACHE_PATH,
+    DETAILS_REVALIDATE_AFTER,
+    FULLTEXT_INDEX_PATH,
+    SPECS_FILE,
+    SPECS_RELOAD_INTERVAL,
+    WARM_CACHE_RATE,
+    WARM_CACHE_SPECS,
+    WARM_CACHE_WORKERS,
+)
 
 drive = Drive()
+assets = AssetStore(ASSETS_DIR)
+spec_details = SpecDetails(
+    drive,
+    cache=SQLiteCache(DETAILS_CACHE_PATH, max_size=DETAILS_CACHE_MAX_SIZE),
+    revalidate_after=DETAILS_REVALIDATE_AFTER,
+    artifacts=ArtifactStore(ARTIFACTS_DIR) if ARTIFACTS_DIR else None,
+    assets=assets,
+)
+fulltext = FullTextIndex(FULLTEXT_INDEX_PATH) if FULLTEXT_INDEX_PATH else None
 
 app = FlaskBase(
     __name__,
@@ -27,75 +54,246 @@ app = FlaskBase(
 
 init_sso(app)
 
-SPECS_FILE = "specs.json"
-all_specs = []
-if os.path.exists(SPECS_FILE):
-    with open(SPECS_FILE) as f:
-        all_specs = json.load(f)
+catalog_loader = CatalogLoader(SPECS_FILE)
+if SPECS_RELOAD_INTERVAL:
+    catalog_loader.start(interval=SPECS_RELOAD_INTERVAL)
+
+
+def warm_recent_specs(count, workers, rate):
+    specs = catalog_loader.catalog.recently_updated(count)
+    warm_cache(
+        spec_details,
+        [spec["fileID"] for spec in specs],
+        workers=workers,
+        rate=rate,
+    )
 
 
 @app.route("/")
+@timed("view_index")
 def index():
-    specs = []
-    teams = set()
-    for spec in copy.deepcopy(all_specs):
-        spec["authors"] = parse_authors(spec["authors"])
-        if spec["folderName"]:
-            teams.add(spec["folderName"])
-        specs.append(spec)
-    specs = unify_authors(specs)
-    teams = sorted(teams)
+    catalog = catalog_loader.catalog
+
+    return render_template(
+        "index.html",
+        catalog_url=url_for("catalog_json", v=catalog.version),
+        positions_json="null",
+        teams_json=catalog.teams_json,
+    )
+
+
+@app.route("/catalog.json")
+@timed("view_catalog")
+def catalog_json():
+    """
+    The specs catalog, in the columnar layout of `encode_columns`.
+
+    Pages link to it with the version of the catalog in the URL, so it can
+    be cached until the catalog changes, and revalidated with its ETag.
+    """
+    catalog = catalog_loader.catalog
+
+    if flask.request.accept_encodings["gzip"]:
+        response = app.response_class(
+            catalog.payload_gzip, mimetype="application/json"
+        )
+        response.content_encoding = "gzip"
+        response.set_etag(f"{catalog.version}-gzip")
+    else:
+        response = app.response_class(
+            catalog.payload, mimetype="application/json"
+        )
+        response.set_etag(catalog.version)
+    response.vary.add("Accept-Encoding")
+
+    if flask.request.args.get("v") == catalog.version:
+        cache_control = "private, max-age=31536000, immutable"
+    else:
+        cache_control = "private, no-cache"
+    response.headers["Cache-Control"] = cache_control
 
-    return render_template("index.html", specs=specs, teams=teams)
+    return response.make_conditional(flask.request)
 
 
 @app.route("/spec/<spec_name>")
 def spec(spec_name):
-    for spec in all_specs:
-        if spec_name.upper() == spec["index"]:
-            return redirect(spec["fileURL"])
-    else:
+    spec = catalog_loader.catalog.get_by_index(spec_name)
+    if not spec:
         abort(404)
 
+    return redirect(spec["fileURL"])
+
+
+def set_document_validators(response, modified_time):
+    """
+    Identify the version of a document in a /spec-details response by its
+    Drive modifiedTime, and have browsers revalidate it on every use
+    """
+    response.set_etag(modified_time)
+    response.last_modified = (
+        parse(modified_time).astimezone(UTC).replace(tzinfo=None)
+    )
+    response.headers["Cache-Control"] = "private, no-cache"
+
 
 @app.route("/spec-details/<document_id>")
-# Cache for 30 minutes
-@cached(cache=TTLCache(maxsize=128, ttl=CACHE_TTL))
+@timed("view_spec_details")
 def get_document(document_id):
     try:
-        spec = Spec(drive, document_id)
+        if flask.request.if_none_match or flask.request.if_modified_since:
+            # Check the version of the document first, it's cheaper than
+            # loading or exporting it
+            modified_time = spec_details.modified_time(document_id)
+            response = app.response_class(mimetype="application/json")
+            set_document_validators(response, modified_time)
+            response.make_conditional(flask.request)
+            if response.status_code == 304:
+                return response
+
+        details = spec_details.get(document_id)
     except Exception as e:
         err = "Error fetching document, try again."
         print(f"{err}\n {e}")
+        count(errors, stage="spec_details")
         abort(500, description=err)
-    payload = {
-        "metadata": spec.metadata,
-        "url": spec.url,
-        "html": spec.html.encode("utf-8").decode(),
-    }
-    return jsonify(payload)
+
+    response = app.response_class(details.payload, mimetype="application/json")
+    set_document_validators(response, details.modified_time)
+    return response
+
+
+@app.route("/spec-asset/<name>")
+@timed("view_spec_asset")
+def spec_asset(name):
+    """
+    Images of the documents. They are named after their content, so they
+    can be cached for good.
+    """
+    try:
+        path = assets.path(name)
+    except ValueError:
+        abort(404)
+    if not os.path.exists(path):
+        abort(404)
+
+    # Sent with the file wrapper of the server (sendfile with gunicorn),
+    # and supports range requests
+    response = flask.send_file(path, conditional=True)
+    response.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
+
+
+@app.route("/api/specs")
+@timed("view_search_specs")
+def search_specs():
+    """
+    Search the specs, with the same filters and sort orders as the client.
+    "all" disables the team and author filters, as in the client.
+    """
+    args = flask.request.args
+    team = args.get("team")
+    author = args.get("author")
+
+    try:
+        query = SearchQuery(
+            text=args.get("q", ""),
+            team=team if team != "all" else None,
+            statuses=args.getlist("status"),
+            types=args.getlist("type"),
+            author=author if author != "all" else None,
+            sort_by=args.get("sortBy", "date"),
+            page=args.get("page", 1, type=int),
+            per_page=args.get("perPage", 50, type=int),
+        )
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    return flask.jsonify(catalog_loader.catalog.search_index.search(query))
+
+
+@app.route("/api/search")
+@timed("view_search_content")
+def search_content():
+    """
+    Search the content of the specs, in the full-text index built by the
+    update job
+    """
+    if not fulltext:
+        abort(404)
+
+    text = flask.request.args.get("q", "")
+    limit = max(1, min(flask.request.args.get("limit", 20, type=int), 100))
+
+    try:
+        results = fulltext.search(text, limit=limit)
+    except Exception as e:
+        err = "Error searching the specs, try again."
+        print(f"{err}\n {e}")
+        count(errors, stage="search_content")
+        abort(500, description=err)
+
+    return flask.jsonify(results)
+
+
+@app.route("/_status/spec-details")
+def spec_details_status():
+    """
+    Documents exported for /spec-details, and requests that waited for
+    an export already in flight instead
+    """
+    return flask.jsonify(
+        {
+            "originatedFetches": spec_details.fetches.originated,
+            "coalescedFetches": spec_details.fetches.coalesced,
+        }
+    )
 
 
 @app.route("/my-specs")
+@timed("view_my_specs")
 def my_specs():
-    specs = []
-    teams = set()
     user = flask.session["openid"]
-    for spec in copy.deepcopy(all_specs):
-        spec["authors"] = parse_authors(spec["authors"])
-        if user["fullname"] in spec["authors"]:
-            if spec["folderName"]:
-                teams.add(spec["folderName"])
-            specs.append(spec)
-    specs = unify_authors(specs)
-    teams = sorted(teams)
+    user_specs = catalog_loader.catalog.for_author(user["fullname"])
 
-    return render_template("index.html", specs=specs, teams=teams)
+    return render_template(
+        "index.html",
+        catalog_url=url_for("catalog_json", v=user_specs.catalog.version),
+        positions_json=user_specs.positions_json,
+        teams_json=user_specs.teams_json,
+    )
 
 
 @app.cli.command("update-spreadsheet")
-def update_spreadsheet():
+@click.option(
+    "--full",
+    is_flag=True,
+    help="Parse all documents again, not only the ones modified",
+)
+def update_spreadsheet(full):
     """
     Update the spreadsheet that contains the specs information
     """
-    update_sheet()
+    update_sheet(full=full)
+
+
+@app.cli.command("warm-cache")
+@click.option(
+    "--count",
+    default=WARM_CACHE_SPECS or 100,
+    show_default=True,
+    help="Number of specs to cache, the most recently updated first",
+)
+@click.option("--workers", default=WARM_CACHE_WORKERS, show_default=True)
+@click.option(
+    "--rate",
+    default=WARM_CACHE_RATE,
+    show_default=True,
+    help="Maximum of specs cached per second",
+)
+def warm_spec_details(count, workers, rate):
+    """
+    Cache the details of the specs, e.g. after a deploy or an update.
+    Run by entrypoint when the container starts if WARM_CACHE_SPECS is set,
+    once for all the workers.
+    """
+    warm_recent_specs(count, workers=workers, rate=rate)
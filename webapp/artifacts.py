@@ -0,0 +1,52 @@
+import gzip
+import os
+import re
+import tempfile
+from typing import Optional
+
+from webapp.cache import CacheEntry
+
+
+class ArtifactStore:
+    """
+    Documents pre-rendered by the update job, stored compressed in a
+    directory that the web pods can read (e.g. a shared volume).
+
+    Each document is a gzip file containing the Drive modifiedTime it was
+    rendered from on the first line, followed by the /spec-details payload.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, document_id: str) -> str:
+        if not re.fullmatch(r"[\w-]+", document_id):
+            raise ValueError(f"Invalid document ID: {document_id}")
+        return os.path.join(self.directory, f"{document_id}.json.gz")
+
+    def exists(self, document_id: str) -> bool:
+        return os.path.exists(self._path(document_id))
+
+    def get(self, document_id: str) -> Optional[CacheEntry]:
+        path = self._path(document_id)
+        try:
+            with open(path, "rb") as f:
+                content = gzip.decompress(f.read())
+                rendered_at = os.fstat(f.fileno()).st_mtime
+        except FileNotFoundError:
+            return None
+
+        modified_time, payload = content.split(b"\n", 1)
+        return CacheEntry(
+            document_id, modified_time.decode(), payload, rendered_at
+        )
+
+    def put(self, document_id: str, modified_time: str, payload: bytes):
+        content = gzip.compress(modified_time.encode() + b"\n" + payload)
+
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory, delete=False
+        ) as f:
+            f.write(content)
+        os.replace(f.name, self._path(document_id))
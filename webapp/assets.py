@@ -0,0 +1,104 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import tempfile
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from webapp.settings import EXPORT_MAX_SIZE
+
+# Images moved out of the documents, with the extension of their files.
+# SVG images stay inline: served from the app, they could run scripts.
+IMAGE_TYPES = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+
+# Hosts of the images linked by the Google Docs exports, that expire
+IMAGE_HOSTS = re.compile(r"[\w-]+\.googleusercontent\.com")
+
+data_uri = re.compile(r"data:([\w/.+-]+);base64,", re.IGNORECASE)
+
+
+class AssetStore:
+    """
+    Images of the documents, stored in a directory under the SHA-256 of
+    their content: they never change, and documents sharing an image
+    share its file.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{64}\.[a-z]+", name):
+            raise ValueError(f"Invalid asset name: {name}")
+        return os.path.join(self.directory, name)
+
+    def put(self, content: bytes, mimetype: str) -> str:
+        """
+        Store an image, returning its name
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        name = f"{digest}.{IMAGE_TYPES[mimetype]}"
+        path = self.path(name)
+
+        if not os.path.exists(path):
+            with tempfile.NamedTemporaryFile(
+                dir=self.directory, delete=False
+            ) as f:
+                f.write(content)
+            os.replace(f.name, path)
+        return name
+
+
+def load_image(
+    src: str, timeout: int = 10, max_size: int = EXPORT_MAX_SIZE
+) -> Optional[Tuple[bytes, str]]:
+    """
+    Get the content and MIME type of an image of a document, from its
+    data URI or by downloading it from Google. Return None for other
+    images, or if it can't be loaded (or takes more than `max_size`
+    bytes).
+    """
+    match = data_uri.match(src)
+    if match:
+        mimetype = match.group(1).lower()
+        if mimetype not in IMAGE_TYPES:
+            return None
+        end = match.end()
+        try:
+            return base64.b64decode(src[end:]), mimetype
+        except binascii.Error:
+            return None
+
+    url = urlparse(src)
+    if url.scheme != "https" or not IMAGE_HOSTS.fullmatch(url.hostname or ""):
+        return None
+    try:
+        with requests.get(src, stream=True, timeout=timeout) as response:
+            mimetype = response.headers.get("Content-Type", "")
+            mimetype = mimetype.split(";")[0].strip()
+            if response.status_code != 200 or mimetype not in IMAGE_TYPES:
+                return None
+
+            too_large = ValueError(f"Image larger than {max_size} bytes")
+            if int(response.headers.get("Content-Length") or 0) > max_size:
+                raise too_large
+            content = io.BytesIO()
+            for chunk in response.iter_content(64 * 1024):
+                content.write(chunk)
+                if content.tell() > max_size:
+                    raise too_large
+    except Exception as e:
+        print(f"Unable to download image: {src}", e)
+        return None
+    return content.getvalue(), mimetype
@@ -1,4 +1,34 @@
 import re
+import unicodedata
+from functools import lru_cache
+
+# name <email>
+# name (canonical)
+author_details = re.compile(r"\(.*\)|<.*>")
+
+# Latin letters that NFKD doesn't decompose into a base letter and marks
+latin_letters = str.maketrans(
+    {
+        "ø": "o",
+        "Ø": "o",
+        "ł": "l",
+        "Ł": "l",
+        "đ": "d",
+        "Đ": "d",
+        "ð": "d",
+        "Ð": "d",
+        "ħ": "h",
+        "Ħ": "h",
+        "ı": "i",
+        "ß": "ss",
+        "æ": "ae",
+        "Æ": "ae",
+        "œ": "oe",
+        "Œ": "oe",
+        "þ": "th",
+        "Þ": "th",
+    }
+)
 
 
 def parse_authors(authors):
@@ -6,14 +36,9 @@ def parse_authors(authors):
     Get rid of email and other additional information
     in the authors name field.
     """
-    authors = authors.split(",")
-    parsed_authors = []
-    for author in authors:
-        # name <email>
-        # name (canonical)
-        author = re.sub("(\\(.*\\)|<.*>)", "", author).strip()
-        parsed_authors.append(author)
-    return parsed_authors
+    return [
+        author_details.sub("", author).strip() for author in authors.split(",")
+    ]
 
 
 def unify_authors(specs):
@@ -25,25 +50,25 @@ def unify_authors(specs):
     for spec in specs:
         for author in spec["authors"]:
             # García -> Garcia
-            normalized_name = normalize_name(author)
-            unique_authors[normalized_name] = unique_authors.get(
-                normalized_name, author
-            )
+            unique_authors.setdefault(normalize_name(author), author)
     for spec in specs:
-        authors = spec["authors"]
-        new_authors = []
-        for author in authors:
-            new_authors.append(unique_authors[normalize_name(author)])
-        spec["authors"] = new_authors
+        spec["authors"] = [
+            unique_authors[normalize_name(author)]
+            for author in spec["authors"]
+        ]
     return specs
 
 
+@lru_cache(maxsize=4096)
 def normalize_name(author):
-    author = re.sub("[àáâãäå]", "a", author, flags=re.I)
-    author = re.sub("[ç]", "c", author, flags=re.I)
-    author = re.sub("[èéêë]", "e", author, flags=re.I)
-    author = re.sub("[ìíîï]", "i", author, flags=re.I)
-    author = re.sub("[òóôõö]", "o", author, flags=re.I)
-    author = re.sub("[ùúûü]", "u", author, flags=re.I)
-    author = re.sub("[ýÿ]", "y", author, flags=re.I)
-    return author.lower()
+    """
+    Fold a name to lowercase ASCII letters where possible, so that
+    spelling variants compare equal: "José García" -> "jose garcia"
+    """
+    if author.isascii():
+        return author.lower()
+
+    decomposed = unicodedata.normalize("NFKD", author.translate(latin_letters))
+    return "".join(
+        c for c in decomposed if not unicodedata.combining(c)
+    ).lower()
@@ -1,8 +1,14 @@
-import json
 from datetime import datetime
 
 from webapp.google import Sheets
-from webapp.settings import TRACKER_SPREADSHEET_ID, SPECS_SHEET_TITLE
+from webapp.utils import write_json_array
+from webapp.settings import (
+    BUILD_SPECS_PAGE_SIZE,
+    BUILD_SPECS_WORKERS,
+    SPECS_FILE,
+    TRACKER_SPREADSHEET_ID,
+    SPECS_SHEET_TITLE,
+)
 
 
 def get_value_row(row, type):
@@ -29,7 +35,9 @@ def is_spec(row):
 
     return "userEnteredValue" in row[1]
 
-def generate_specs(sheet):
+def generate_specs(rows):
+    """Read the specs from the rows of the Specs sheet."""
+
     COLUMNS = [
         ("folderName", str),
         ("fileName", str),
@@ -46,7 +54,7 @@ def generate_specs(sheet):
         ("openComments", int),
     ]
 
-    for row in sheet["data"][0]["rowData"]:
+    for row in rows:
         if "values" in row and is_spec(row["values"]):
             spec = {}
             for column_index in range(len(COLUMNS)):
@@ -61,15 +69,17 @@ def generate_specs(sheet):
 
 
 if __name__ == "__main__":
-    spreadsheet = Sheets(spreadsheet_id=TRACKER_SPREADSHEET_ID) 
-    
-    RANGE = "A2:M" 
-    sheet = spreadsheet.get_sheet_by_title(
-        title=SPECS_SHEET_TITLE, ranges=[f"{SPECS_SHEET_TITLE}!{RANGE}"]
-    )
-    
-    specs = list(generate_specs(sheet))
+    spreadsheet = Sheets(spreadsheet_id=TRACKER_SPREADSHEET_ID)
 
-    with open("specs.json", "w") as f:
-        json.dump(specs, f, indent=4)
+    # The first row holds the column names
+    rows = spreadsheet.iter_rows(
+        title=SPECS_SHEET_TITLE,
+        columns="A:M",
+        first_row=2,
+        fields="userEnteredValue,formattedValue",
+        page_size=BUILD_SPECS_PAGE_SIZE,
+        workers=BUILD_SPECS_WORKERS,
+    )
 
+    # Running apps reload the file when it changes
+    write_json_array(SPECS_FILE, generate_specs(rows))
@@ -0,0 +1,178 @@
+import queue
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing, contextmanager
+from typing import NamedTuple, Optional
+
+from webapp.metrics import count, details_cache_evictions
+
+# The last access of cached documents is only updated once older than this
+# (in seconds), so that most cache hits don't write
+ACCESS_RESOLUTION = 60
+
+# Idle SQLite connections kept open for the next calls
+MAX_IDLE_CONNECTIONS = 16
+
+
+class CacheEntry(NamedTuple):
+    document_id: str
+    # Drive modifiedTime of the document the payload was rendered from
+    modified_time: str
+    payload: bytes
+    # When the document was last checked for changes
+    checked_at: float
+
+
+class DetailsCache(ABC):
+    """
+    Interface of the caches for rendered documents, keyed by
+    document ID and Drive modifiedTime
+    """
+
+    @abstractmethod
+    def get(self, document_id: str) -> Optional[CacheEntry]:
+        pass
+
+    @abstractmethod
+    def set(
+        self,
+        document_id: str,
+        modified_time: str,
+        payload: bytes,
+        checked_at: float = None,
+    ):
+        pass
+
+    @abstractmethod
+    def mark_checked(self, document_id: str) -> None:
+        """
+        Record that the cached document was checked for changes now
+        """
+
+
+class SQLiteCache(DetailsCache):
+    """
+    Cache stored in an SQLite database, which all the workers and
+    processes of a host can share.
+
+    When the payloads take more than `max_size` bytes, the least
+    recently used ones are evicted (to ACCESS_RESOLUTION).
+    """
+
+    def __init__(self, path: str, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self._connections = queue.LifoQueue()
+
+        # Not kept in the pool: the app is imported before the workers fork
+        with closing(sqlite3.connect(path)) as connection, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS details (
+                    document_id TEXT PRIMARY KEY,
+                    modified_time TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    checked_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS details_accessed_at"
+                " ON details (accessed_at)"
+            )
+
+    @contextmanager
+    def _connection(self):
+        """
+        Borrow a connection from the pool, in a transaction. Connections
+        are only used by one thread (or greenlet) at a time.
+        """
+        try:
+            connection = self._connections.get_nowait()
+        except queue.Empty:
+            connection = sqlite3.connect(
+                self.path, timeout=10, check_same_thread=False
+            )
+
+        try:
+            with connection:
+                yield connection
+        finally:
+            if self._connections.qsize() < MAX_IDLE_CONNECTIONS:
+                self._connections.put(connection)
+            else:
+                connection.close()
+
+    def get(self, document_id):
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT document_id, modified_time, payload, checked_at,"
+                " accessed_at FROM details WHERE document_id = ?",
+                (document_id,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            *entry, accessed_at = row
+            now = time.time()
+            if now - accessed_at > ACCESS_RESOLUTION:
+                connection.execute(
+                    "UPDATE details SET accessed_at = ? WHERE document_id = ?",
+                    (now, document_id),
+                )
+
+        return CacheEntry(*entry)
+
+    def set(self, document_id, modified_time, payload, checked_at=None):
+        now = time.time()
+        if checked_at is None:
+            checked_at = now
+
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO details"
+                " (document_id, modified_time, payload, size, checked_at,"
+                " accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    document_id,
+                    modified_time,
+                    payload,
+                    len(payload),
+                    checked_at,
+                    now,
+                ),
+            )
+            self._evict(connection)
+
+    def mark_checked(self, document_id):
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE details SET checked_at = ? WHERE document_id = ?",
+                (time.time(), document_id),
+            )
+
+    def _evict(self, connection):
+        (total_size,) = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM details"
+        ).fetchone()
+        if total_size <= self.max_size:
+            return
+
+        rows = connection.execute(
+            "SELECT document_id, size FROM details ORDER BY accessed_at"
+        )
+        evicted = []
+        for document_id, size in rows:
+            if total_size <= self.max_size:
+                break
+            evicted.append((document_id,))
+            total_size -= size
+
+        connection.executemany(
+            "DELETE FROM details WHERE document_id = ?", evicted
+        )
+        count(details_cache_evictions, len(evicted))
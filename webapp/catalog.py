@@ -0,0 +1,226 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from jinja2.utils import htmlsafe_json_dumps
+
+from webapp.authors import normalize_name, parse_authors, unify_authors
+from webapp.search import SpecIndex
+
+
+# Fields of the specs sent to the client, in the catalog payload
+CATALOG_FIELDS = (
+    "folderName",
+    "fileName",
+    "fileID",
+    "fileURL",
+    "index",
+    "title",
+    "status",
+    "authors",
+    "type",
+    "created",
+    "lastUpdated",
+    "numberOfComments",
+    "openComments",
+)
+
+# Fields with few distinct values, sent as positions in a list of values
+DICTIONARY_FIELDS = ("folderName", "status", "type")
+
+
+def to_json(value):
+    """
+    Serialize a value for embedding in a <script> tag, the same way as
+    the `tojson` template filter
+    """
+    return htmlsafe_json_dumps(value, dumps=json.dumps)
+
+
+def encode_columns(specs):
+    """
+    Encode specs in a columnar layout, with one list of values per field
+    rather than one object per spec, so that field names aren't repeated
+    for every spec. DICTIONARY_FIELDS are encoded as positions in the
+    list of their distinct values.
+    """
+    columns = {}
+    dictionaries = {}
+    for field in CATALOG_FIELDS:
+        values = [spec.get(field) for spec in specs]
+        if field in DICTIONARY_FIELDS:
+            codes = {}
+            values = [codes.setdefault(value, len(codes)) for value in values]
+            dictionaries[field] = list(codes)
+        columns[field] = values
+
+    return {
+        "length": len(specs),
+        "columns": columns,
+        "dictionaries": dictionaries,
+    }
+
+
+class Catalog:
+    """
+    Read-only view over the specs in specs.json, with everything the
+    pages need computed once at load time: authors parsed and unified,
+    the sorted list of teams and the catalog payload served to the
+    client, compressed and versioned by the hash of its content.
+
+    Nothing in here must be mutated once built, requests share it.
+    """
+
+    def __init__(self, raw_specs):
+        specs = []
+        teams = set()
+        for raw_spec in raw_specs:
+            spec = dict(raw_spec)
+            spec["authors"] = parse_authors(spec["authors"])
+            if spec["folderName"]:
+                teams.add(spec["folderName"])
+            specs.append(spec)
+
+        self.specs = tuple(unify_authors(specs))
+        self.teams = tuple(sorted(teams))
+        self.teams_json = to_json(self.teams)
+
+        self.payload = json.dumps(
+            encode_columns(self.specs), separators=(",", ":")
+        ).encode()
+        # mtime=0 so that the same catalog always compresses the same way
+        self.payload_gzip = gzip.compress(self.payload, mtime=0)
+        self.version = hashlib.sha256(self.payload).hexdigest()[:16]
+
+        self._by_index = {}
+        # normalized author name -> positions of their specs in self.specs
+        self._by_author = {}
+        for position, spec in enumerate(self.specs):
+            self._by_index.setdefault(spec["index"], spec)
+            for author in spec["authors"]:
+                positions = self._by_author.setdefault(
+                    normalize_name(author), []
+                )
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+
+        self._author_views = {}
+        self.search_index = SpecIndex(self.specs)
+
+    @classmethod
+    def from_file(cls, path):
+        if not os.path.exists(path):
+            return cls([])
+
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def __len__(self):
+        return len(self.specs)
+
+    def get_by_index(self, index):
+        """
+        Return the spec with the given index (e.g. "WD001"), if any
+        """
+        return self._by_index.get(index.upper())
+
+    def recently_updated(self, count):
+        """
+        Return the `count` most recently updated specs
+        """
+        rank = self.search_index.ranks["date"]
+        positions = sorted(range(len(self.specs)), key=rank.__getitem__)
+        return [self.specs[p] for p in positions[:count]]
+
+    def for_author(self, fullname):
+        """
+        Return the specs written by an author as a CatalogView,
+        ignoring differences in case and accents in their name
+        """
+        key = normalize_name(fullname.strip())
+        positions = self._by_author.get(key)
+        if not positions:
+            return CatalogView(self, [])
+
+        view = self._author_views.get(key)
+        if view is None:
+            view = CatalogView(self, positions)
+            self._author_views[key] = view
+        return view
+
+
+class CatalogView:
+    """
+    A subset of the catalog, with its teams and JSON precomputed.
+
+    The client loads the whole catalog payload, which it can cache, and
+    only gets the positions of the specs in the view in the page.
+    """
+
+    def __init__(self, catalog, positions):
+        self.catalog = catalog
+        self.positions = tuple(positions)
+        self.specs = tuple(catalog.specs[p] for p in positions)
+        teams = {s["folderName"] for s in self.specs if s["folderName"]}
+        self.teams = tuple(sorted(teams))
+        self.positions_json = to_json(self.positions)
+        self.teams_json = to_json(self.teams)
+
+
+class CatalogLoader:
+    """
+    Hold the catalog built from a specs file, and reload it when the
+    file changes.
+
+    The new catalog is fully built before it replaces the current one in
+    a single assignment, so requests reading `loader.catalog` always get
+    a complete catalog, either the old or the new one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._version = self._file_version()
+        self.catalog = Catalog.from_file(path)
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def refresh(self) -> bool:
+        """
+        Reload the catalog if the specs file changed since the last load.
+        Return whether it was reloaded.
+        """
+        version = self._file_version()
+        if version == self._version:
+            return False
+
+        catalog = Catalog.from_file(self.path)
+        self._version = version
+        self.catalog = catalog
+        return True
+
+    def start(self, interval):
+        """
+        Check for changes every `interval` seconds in a background thread
+        (a greenlet when running with gevent workers)
+        """
+        thread = threading.Thread(
+            target=self._watch, args=(interval,), daemon=True
+        )
+        thread.start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the current catalog, retry on the next check
+                print(f"Unable to reload {self.path}", e)
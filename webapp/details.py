@@ -0,0 +1,201 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import flask
+
+from webapp.artifacts import ArtifactStore
+from webapp.assets import AssetStore
+from webapp.cache import CacheEntry, DetailsCache
+from webapp.google import Drive
+from webapp.metrics import count, details_cache, errors, timed
+from webapp.spec import Spec
+
+
+@timed("spec_render_json")
+def render_payload(spec: Spec) -> bytes:
+    """
+    Render the /spec-details JSON response of a document
+    """
+    return flask.json.dumps(
+        {
+            "metadata": spec.metadata,
+            "url": spec.url,
+            "html": str(spec.html),
+        }
+    ).encode("utf-8")
+
+
+class SingleFlight:
+    """
+    Run a function once for concurrent calls with the same key: calls
+    made while one is in flight wait for its result, or get its error.
+    Errors aren't kept, the next call runs the function again.
+
+    Counts the calls that ran the function (`originated`) and the ones
+    that waited for another call (`coalesced`).
+    """
+
+    def __init__(self):
+        self.originated = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, function, *args):
+        with self._lock:
+            in_flight = self._calls.get(key)
+            if in_flight is not None:
+                self.coalesced += 1
+            else:
+                self.originated += 1
+                call = self._calls[key] = Future()
+
+        if in_flight is not None:
+            return in_flight.result()
+
+        try:
+            result = function(*args)
+        except Exception as e:
+            call.set_exception(e)
+            raise
+        except BaseException as e:
+            # The call was killed (gevent.Timeout, GreenletExit...): release
+            # the waiting calls with an ordinary error, the exception only
+            # concerns this one
+            error = RuntimeError(f"Call interrupted: {key}")
+            error.__cause__ = e
+            call.set_exception(error)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class SpecDetails:
+    """
+    Render documents for /spec-details, and serve them from a cache
+    until they are modified in Google Drive.
+
+    Documents missing from the cache are taken from the documents
+    pre-rendered by the update job, if any, before exporting them.
+
+    Cached documents older than `revalidate_after` seconds are served
+    stale while a background thread checks whether they changed.
+
+    Concurrent fetches of the same document share a single export.
+
+    The Drive modifiedTime of the documents identifies their versions,
+    for conditional requests.
+
+    The images of the documents are moved to `assets` if given.
+    """
+
+    def __init__(
+        self,
+        drive: Drive,
+        cache: DetailsCache,
+        revalidate_after: int,
+        artifacts: ArtifactStore = None,
+        assets: AssetStore = None,
+    ):
+        self.drive = drive
+        self.cache = cache
+        self.revalidate_after = revalidate_after
+        self.artifacts = artifacts
+        self.assets = assets
+        self.fetches = SingleFlight()
+
+    def get(self, document_id: str) -> CacheEntry:
+        entry = self.cache.get(document_id)
+        if entry is None and self.artifacts:
+            entry = self.artifacts.get(document_id)
+            if entry is not None:
+                count(details_cache, result="prerendered")
+                self.cache.set(*entry)
+        if entry is None:
+            count(details_cache, result="miss")
+            return self.fetches.run(document_id, self.fetch, document_id)
+
+        if time.time() - entry.checked_at <= self.revalidate_after:
+            count(details_cache, result="hit")
+        else:
+            count(details_cache, result="stale")
+            # Stop other requests from revalidating it at the same time
+            self.cache.mark_checked(document_id)
+            thread = threading.Thread(
+                target=self.revalidate, args=(entry,), daemon=True
+            )
+            thread.start()
+
+        return entry
+
+    def warm(self, document_id: str) -> None:
+        """
+        Make sure a document is cached and up to date, without waiting for
+        a request to get it
+        """
+        entry = self.cache.get(document_id)
+        if entry is None:
+            self.get(document_id)
+        elif time.time() - entry.checked_at > self.revalidate_after:
+            self.cache.mark_checked(document_id)
+            self.revalidate(entry)
+
+    def modified_time(self, document_id: str) -> str:
+        """
+        Return the Drive modifiedTime of a document: the cached one if it
+        was checked recently, otherwise read from the file metadata,
+        without exporting the document
+        """
+        entry = self.cache.get(document_id)
+        if entry and time.time() - entry.checked_at <= self.revalidate_after:
+            return entry.modified_time
+
+        modified_time = self._get_modified_time(document_id)
+        if entry and entry.modified_time == modified_time:
+            self.cache.mark_checked(document_id)
+        return modified_time
+
+    def _get_modified_time(self, document_id: str) -> str:
+        return self.drive.get_file(document_id, fields=("modifiedTime",))[
+            "modifiedTime"
+        ]
+
+    def fetch(self, document_id: str) -> CacheEntry:
+        """
+        Export and render a document, and cache it
+        """
+        # Read before exporting: if the document changes in the meantime,
+        # the next revalidation will fetch it again
+        modified_time = self._get_modified_time(document_id)
+
+        spec = Spec(self.drive, document_id, assets=self.assets)
+        payload = render_payload(spec)
+
+        self.cache.set(document_id, modified_time, payload)
+        return CacheEntry(document_id, modified_time, payload, time.time())
+
+    def revalidate(self, entry: CacheEntry) -> None:
+        """
+        Fetch a cached document again if it was modified, from the
+        documents pre-rendered by the update job if it rendered this version
+        """
+        document_id = entry.document_id
+        try:
+            modified_time = self._get_modified_time(document_id)
+            if modified_time == entry.modified_time:
+                return
+
+            artifact = self.artifacts and self.artifacts.get(document_id)
+            if artifact and artifact.modified_time == modified_time:
+                count(details_cache, result="prerendered")
+                self.cache.set(document_id, modified_time, artifact.payload)
+            else:
+                self.fetches.run(document_id, self.fetch, document_id)
+        except Exception as e:
+            print(f"Unable to revalidate document: {document_id}", e)
+            count(errors, stage="revalidate")
@@ -0,0 +1,133 @@
+import html
+import re
+import sqlite3
+from contextlib import closing
+from typing import Iterable, Tuple
+
+# Wrap the matches in the snippets, escaped before they are turned into
+# <mark> elements
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+term_pattern = re.compile(r"\w+")
+
+
+def to_match_query(text: str) -> str:
+    """
+    Turn the text typed by a user into an FTS5 query matching the
+    documents that contain all its words, or words starting with them,
+    so that FTS5 query syntax in the text can't cause errors
+    """
+    return " ".join(f'"{term}"*' for term in term_pattern.findall(text))
+
+
+class FullTextIndex:
+    """
+    Full-text index of the content of the documents, in an SQLite FTS5
+    database.
+
+    The update job writes it as documents are modified, the web app opens
+    it read-only for searches.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def create(self):
+        with closing(sqlite3.connect(self.path)) as connection, connection:
+            connection.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+                    document_id UNINDEXED,
+                    modified_time UNINDEXED,
+                    title,
+                    body,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+                """
+            )
+
+    def _connect_read_only(self):
+        connection = sqlite3.connect(
+            f"file:{self.path}?mode=ro", uri=True, timeout=10
+        )
+        connection.execute("PRAGMA mmap_size = 268435456")
+        return connection
+
+    def versions(self) -> dict:
+        """
+        Return the modifiedTime of the indexed documents, keyed by ID
+        """
+        with closing(sqlite3.connect(self.path)) as connection:
+            return dict(
+                connection.execute(
+                    "SELECT document_id, modified_time FROM documents"
+                )
+            )
+
+    def update(
+        self,
+        documents: Iterable[Tuple[str, str, str, str]],
+        keep: Iterable[str] = None,
+    ):
+        """
+        Index `documents`, as (ID, modifiedTime, title, text) tuples,
+        replacing their previous versions. If `keep` is given, remove the
+        documents whose ID isn't in it. All in a single transaction.
+        """
+        with closing(sqlite3.connect(self.path)) as connection, connection:
+            for document_id, modified_time, title, text in documents:
+                connection.execute(
+                    "DELETE FROM documents WHERE document_id = ?",
+                    (document_id,),
+                )
+                connection.execute(
+                    "INSERT INTO documents"
+                    " (document_id, modified_time, title, body)"
+                    " VALUES (?, ?, ?, ?)",
+                    (document_id, modified_time, title, text),
+                )
+
+            if keep is not None:
+                keep = set(keep)
+                removed = [
+                    (document_id,)
+                    for (document_id,) in connection.execute(
+                        "SELECT document_id FROM documents"
+                    )
+                    if document_id not in keep
+                ]
+                connection.executemany(
+                    "DELETE FROM documents WHERE document_id = ?", removed
+                )
+
+    def search(self, text: str, limit: int = 20) -> list:
+        """
+        Return the documents matching a text, best matches first, with a
+        snippet of their content around the matches (HTML, with the
+        matches in <mark> elements)
+        """
+        query = to_match_query(text)
+        if not query:
+            return []
+
+        with closing(self._connect_read_only()) as connection:
+            rows = connection.execute(
+                "SELECT document_id, title,"
+                " snippet(documents, 3, ?, ?, '…', 24)"
+                " FROM documents WHERE documents MATCH ?"
+                # Matches in titles weigh more than in the content
+                " ORDER BY bm25(documents, 0, 0, 10, 1) LIMIT ?",
+                (MATCH_START, MATCH_END, query, limit),
+            ).fetchall()
+
+        return [
+            {
+                "fileID": document_id,
+                "title": title,
+                "snippet": html.escape(snippet)
+                .replace(MATCH_START, "<mark>")
+                .replace(MATCH_END, "</mark>"),
+            }
+            for document_id, title, snippet in rows
+        ]
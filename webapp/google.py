@@ -1,68 +1,353 @@
 import io
 import os
 import hashlib
+import queue
+import random
 import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
-from apiclient.http import MediaIoBaseDownload
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp, Request
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
 
 
-from webapp.settings import SERVICE_ACCOUNT_INFO
+from webapp.metrics import timer
+from webapp.settings import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_MAX_SIZE,
+    SERVICE_ACCOUNT_INFO,
+)
 from typing import List
 
+# Requests failing with a 429 or 5xx status are retried, waiting
+# exponentially longer between attempts
+NUM_RETRIES = 5
 
-class Drive:
-    def __init__(self):
-        scopes = [
-            "https://www.googleapis.com/auth/drive.readonly",
-        ]
-        credentials = service_account.Credentials.from_service_account_info(
-            SERVICE_ACCOUNT_INFO, scopes=scopes
-        )
-        self.service = build(
-            "drive", "v3", credentials=credentials, cache_discovery=False
+# Maximum number of calls in a batch request accepted by Google APIs
+BATCH_SIZE = 100
+
+# Keep Drive search queries well below the length the API accepts
+MAX_QUERY_LENGTH = 2000
+
+
+# Scopes of the credentials shared by the Drive and Sheets clients
+SCOPES = [
+    "https://www.googleapis.com/auth/drive.readonly",
+    "https://www.googleapis.com/auth/spreadsheets",
+]
+
+# Idle HTTP transports kept open for the next requests
+MAX_IDLE_TRANSPORTS = 16
+
+EXPORT_URL = "https://www.googleapis.com/drive/v3/files/{}/export"
+# Seconds to wait for the connection to Drive, and then for each read
+EXPORT_TIMEOUT = (10, 60)
+
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, HttpError) and (
+        error.resp.status == 429 or error.resp.status >= 500
+    )
+
+
+class GoogleClients:
+    """
+    What Google API clients need, shared by all the threads (and
+    greenlets) of a process:
+
+    - One set of credentials, refreshed by one thread at a time
+    - One service object per API, built from the discovery cache
+    - A pool of HTTP transports, each keeping its connections open.
+      httplib2 transports aren't thread safe, so each request borrows
+      one for itself, with `http()`.
+    - One requests session, for the downloads that need to be streamed
+      (httplib2 reads whole responses), with `session()`.
+    """
+
+    def __init__(self, scopes=SCOPES):
+        self.credentials = (
+            service_account.Credentials.from_service_account_info(
+                SERVICE_ACCOUNT_INFO, scopes=scopes
+            )
         )
+        self._services = {}
+        self._transports = queue.LifoQueue()
+        self._session = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
 
-    def get_comments(self, file_id, fields=None):
-        fields = f"comments({','.join(fields)})" if fields else None
+    def service(self, name, version):
+        with self._lock:
+            if (name, version) not in self._services:
+                self._services[(name, version)] = build(
+                    name,
+                    version,
+                    credentials=self.credentials,
+                    cache=DiscoveryCache(),
+                )
+            return self._services[(name, version)]
 
-        response = (
-            self.service.comments()
-            .list(fileId=file_id, fields=fields)
-            .execute()
+    def _refresh_credentials(self):
+        # Refreshed here rather than by each transport, so that expired
+        # credentials are only refreshed once
+        with self._refresh_lock:
+            if not self.credentials.valid:
+                self.credentials.refresh(Request(build_http()))
+
+    @contextmanager
+    def http(self):
+        """
+        Borrow an authorized HTTP transport from the pool
+        """
+        self._refresh_credentials()
+        try:
+            http = self._transports.get_nowait()
+        except queue.Empty:
+            http = AuthorizedHttp(self.credentials, http=build_http())
+
+        try:
+            yield http
+        finally:
+            if self._transports.qsize() < MAX_IDLE_TRANSPORTS:
+                self._transports.put(http)
+
+    def session(self) -> AuthorizedSession:
+        """
+        Return the authorized requests session, whose connection pool is
+        thread safe
+        """
+        self._refresh_credentials()
+        with self._lock:
+            if self._session is None:
+                self._session = AuthorizedSession(self.credentials)
+            return self._session
+
+
+_clients = None
+_clients_lock = threading.Lock()
+
+
+def get_clients() -> GoogleClients:
+    """
+    Return the Google API clients of the process
+    """
+    global _clients
+    with _clients_lock:
+        if _clients is None:
+            _clients = GoogleClients()
+        return _clients
+
+
+class Drive:
+    """
+    Google Drive client, safe to share between threads
+    """
+
+    def __init__(self, clients: GoogleClients = None):
+        self.clients = clients or get_clients()
+        self.service = self.clients.service("drive", "v3")
+
+    def _execute(self, request):
+        with self.clients.http() as http, timer("drive_request"):
+            return request.execute(http=http, num_retries=NUM_RETRIES)
+
+    def get_comments(self, file_id, fields=None):
+        fields = (
+            f"nextPageToken,comments({','.join(fields)})" if fields else None
         )
 
-        return response.get("comments", [])
+        page_token = None
+        comments = []
+        while True:
+            response = self._execute(
+                self.service.comments().list(
+                    fileId=file_id,
+                    fields=fields,
+                    pageSize=100,
+                    pageToken=page_token,
+                )
+            )
+            comments.extend(response.get("comments", []))
+            page_token = response.get("nextPageToken", None)
+
+            if page_token is None:
+                break
+
+        return comments
+
+    def get_comments_bulk(self, file_ids: List[str]) -> dict:
+        """
+        Count the comments, and how many of them aren't resolved, of many
+        files, listing them in batch requests of up to BATCH_SIZE calls.
+
+        Return {file ID: {"numberOfComments": n, "openComments": n}},
+        files whose comments couldn't be listed are left out.
+        """
+        counts = {
+            file_id: {"numberOfComments": 0, "openComments": 0}
+            for file_id in file_ids
+        }
+        # (file ID, page token, attempt) of the calls left to make
+        pending = [(file_id, None, 0) for file_id in counts]
+
+        while pending:
+            calls, pending = pending[:BATCH_SIZE], pending[BATCH_SIZE:]
+            retry_attempt = 0
+
+            def failed(call, exception):
+                nonlocal retry_attempt
+                file_id, page_token, attempt = call
+                if is_retryable(exception) and attempt < NUM_RETRIES:
+                    pending.append((file_id, page_token, attempt + 1))
+                    retry_attempt = max(retry_attempt, attempt + 1)
+                else:
+                    print(f"Unable to list comments: {file_id}", exception)
+                    counts.pop(file_id, None)
+
+            def callback(request_id, response, exception):
+                call = calls[int(request_id)]
+                file_id = call[0]
+
+                if exception is not None:
+                    failed(call, exception)
+                    return
+
+                comments = response.get("comments", [])
+                counts[file_id]["numberOfComments"] += len(comments)
+                counts[file_id]["openComments"] += len(
+                    [c for c in comments if not c["resolved"]]
+                )
+                if response.get("nextPageToken"):
+                    pending.append((file_id, response["nextPageToken"], 0))
+
+            batch = self.service.new_batch_http_request(callback=callback)
+            for request_id, (file_id, page_token, _) in enumerate(calls):
+                batch.add(
+                    self.service.comments().list(
+                        fileId=file_id,
+                        fields="nextPageToken,comments(resolved)",
+                        pageSize=100,
+                        pageToken=page_token,
+                    ),
+                    request_id=str(request_id),
+                )
+            try:
+                with self.clients.http() as http, timer("drive_batch"):
+                    batch.execute(http=http)
+            except Exception as e:
+                # The batch request itself failed, e.g. rate limited
+                for call in calls:
+                    failed(call, e)
+
+            if retry_attempt:
+                # Back off exponentially before retrying rate limited calls
+                time.sleep(2**retry_attempt + random.random())
+
+        return counts
+
+    def get_file(self, file_id, fields=None):
+        fields = ",".join(fields) if fields else None
 
-    def doc_html(self, document_id):
-        request = self.service.files().export(
-            fileId=document_id, mimeType="text/html"
+        return self._execute(
+            self.service.files().get(
+                fileId=file_id, fields=fields, supportsAllDrives=True
+            )
         )
+
+    def _export(self, document_id, chunk_size, max_size):
+        """
+        Yield the HTML export of a document in chunks of up to
+        `chunk_size` bytes, as it is downloaded. Raise a ValueError as
+        soon as it is announced or read to be larger than `max_size`
+        bytes, without downloading the rest.
+
+        Drive sends exports in one response, that httplib2 would read
+        entirely, so they are streamed with the requests session.
+        """
+        url = EXPORT_URL.format(document_id)
+        for retry_attempt in range(NUM_RETRIES + 1):
+            response = self.clients.session().get(
+                url,
+                params={"mimeType": "text/html"},
+                stream=True,
+                timeout=EXPORT_TIMEOUT,
+            )
+            status = response.status_code
+            if status != 429 and status < 500 or retry_attempt == NUM_RETRIES:
+                break
+            response.close()
+            time.sleep(2**retry_attempt + random.random())
+
+        # Closed without reading the rest if the download is stopped
+        # early, when the generator is closed
+        with response:
+            response.raise_for_status()
+            too_large = ValueError(
+                f"Export of {document_id} larger than {max_size} bytes"
+            )
+            if int(response.headers.get("Content-Length") or 0) > max_size:
+                raise too_large
+
+            size = 0
+            chunks = response.iter_content(chunk_size)
+            while True:
+                with timer("drive_export_chunk"):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                size += len(chunk)
+                if size > max_size:
+                    raise too_large
+                yield chunk
+
+    def doc_html(
+        self,
+        document_id,
+        chunk_size=EXPORT_CHUNK_SIZE,
+        max_size=EXPORT_MAX_SIZE,
+    ) -> bytes:
+        """
+        Export a document as HTML, in UTF-8 (not decoded, see Spec)
+        """
         fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while done is False:
-            _, done = downloader.next_chunk()
-        html = fh.getvalue().decode("utf-8")
+        with timer("drive_export"):
+            for chunk in self._export(document_id, chunk_size, max_size):
+                fh.write(chunk)
+        # Shares the buffer of `fh`, which isn't used anymore
+        return fh.getvalue()
 
-        return html
+    def doc_html_chunks(
+        self, document_id, chunk_size=256 * 1024, max_size=EXPORT_MAX_SIZE
+    ):
+        """
+        Export a document as HTML, yielding the bytes as they are
+        downloaded, in chunks of up to `chunk_size` bytes. The download
+        stops when the generator is closed.
+        """
+        return self._export(document_id, chunk_size, max_size)
 
     def get_files(self, query, fields=None):
-        fields = f"files({','.join(fields)})" if fields else None
+        fields = f"nextPageToken,files({','.join(fields)})" if fields else None
 
         page_token = None
         files = []
         while True:
-            response = (
-                self.service.files()
-                .list(
+            response = self._execute(
+                self.service.files().list(
                     supportsAllDrives=True,
                     includeItemsFromAllDrives=True,
                     fields=fields,
                     q=query,
+                    pageSize=1000,
+                    pageToken=page_token,
                 )
-                .execute()
             )
             files.extend(response.get("files", []))
             page_token = response.get("nextPageToken", None)
@@ -72,6 +357,40 @@ class Drive:
 
         return files
 
+    def get_files_in_folders(self, folder_ids, query, fields) -> dict:
+        """
+        List the files matching a query in many folders, with as few
+        queries as possible: "(query) and ('a' in parents or ...)"
+
+        Return {folder ID: [file, ...]}
+        """
+        fields = tuple(fields) + ("parents",)
+        files_by_folder = {folder_id: [] for folder_id in folder_ids}
+
+        chunks = [[]]
+        length = 0
+        for folder_id in files_by_folder:
+            condition = f"'{folder_id}' in parents"
+            if chunks[-1] and length + len(condition) > MAX_QUERY_LENGTH:
+                chunks.append([])
+                length = 0
+            chunks[-1].append(condition)
+            length += len(condition) + len(" or ")
+
+        for conditions in chunks:
+            if not conditions:
+                continue
+            parents_query = " or ".join(conditions)
+            files = self.get_files(
+                query=f"({query}) and ({parents_query})", fields=fields
+            )
+            for file in files:
+                for parent in file.get("parents", []):
+                    if parent in files_by_folder:
+                        files_by_folder[parent].append(file)
+
+        return files_by_folder
+
 
 class DiscoveryCache:
     """
@@ -101,32 +420,33 @@ class DiscoveryCache:
 
 
 class Sheets:
-    def __init__(self, spreadsheet_id):
+    def __init__(self, spreadsheet_id, clients: GoogleClients = None):
         self.spreadsheet_id = spreadsheet_id
+        self.clients = clients or get_clients()
+        self.spreadsheets = self.clients.service("sheets", "v4").spreadsheets()
 
-        scopes = ["https://www.googleapis.com/auth/spreadsheets"]
-        creds = service_account.Credentials.from_service_account_info(
-            SERVICE_ACCOUNT_INFO, scopes=scopes
-        )
-        service = build(
-            "sheets", "v4", credentials=creds, cache=DiscoveryCache()
-        )
-        self.spreadsheets = service.spreadsheets()
+    def _execute(self, request, num_retries=NUM_RETRIES):
+        with self.clients.http() as http, timer("sheets_request"):
+            return request.execute(http=http, num_retries=num_retries)
 
     def _batch_update(self, body):
-        self.spreadsheets.batchUpdate(
-            spreadsheetId=self.spreadsheet_id, body=body
-        ).execute()
+        self._execute(
+            self.spreadsheets.batchUpdate(
+                spreadsheetId=self.spreadsheet_id, body=body
+            )
+        )
 
     def get_sheet_by_title(self, title, ranges=None) -> dict:
         """
         Return sheet with a given title
         """
-        spreadsheet = self.spreadsheets.get(
-            spreadsheetId=self.spreadsheet_id,
-            ranges=ranges,
-            includeGridData=True,
-        ).execute()
+        spreadsheet = self._execute(
+            self.spreadsheets.get(
+                spreadsheetId=self.spreadsheet_id,
+                ranges=ranges,
+                includeGridData=True,
+            )
+        )
 
         return next(
             s
@@ -134,6 +454,74 @@ class Sheets:
             if s["properties"]["title"] == title
         )
 
+    def get_row_count(self, title: str) -> int:
+        """
+        Return the number of rows of the sheet with a given title,
+        including empty rows
+        """
+        spreadsheet = self._execute(
+            self.spreadsheets.get(
+                spreadsheetId=self.spreadsheet_id,
+                fields="sheets.properties(title,gridProperties.rowCount)",
+            )
+        )
+
+        return next(
+            s["properties"]["gridProperties"]["rowCount"]
+            for s in spreadsheet["sheets"]
+            if s["properties"]["title"] == title
+        )
+
+    def get_rows(self, range: str, fields: str) -> list:
+        """
+        Return the rows of a range, with only the given `fields` of
+        their cells (rather than their whole formatting)
+        """
+        spreadsheet = self._execute(
+            self.spreadsheets.get(
+                spreadsheetId=self.spreadsheet_id,
+                ranges=[range],
+                includeGridData=True,
+                fields=f"sheets.data.rowData.values({fields})",
+            )
+        )
+
+        # Empty pages are left out of the response
+        (sheet,) = spreadsheet.get("sheets", [{}])
+        return sheet.get("data", [{}])[0].get("rowData", [])
+
+    def iter_rows(
+        self,
+        title: str,
+        columns: str,
+        first_row: int,
+        fields: str,
+        page_size: int,
+        workers: int,
+    ):
+        """
+        Yield the rows of a sheet from `first_row`, in the `columns`
+        range (e.g. "A:M"). Pages of `page_size` rows are read in
+        `workers` threads, at most `workers` pages ahead of the rows
+        yielded, so memory doesn't grow with the sheet.
+        """
+        row_count = self.get_row_count(title)
+        first_column, last_column = columns.split(":")
+        ranges = [
+            f"{title}!{first_column}{start}:"
+            f"{last_column}{min(start + page_size - 1, row_count)}"
+            for start in range(first_row, row_count + 1, page_size)
+        ]
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pages = deque()
+            for page_range in ranges:
+                pages.append(pool.submit(self.get_rows, page_range, fields))
+                if len(pages) >= workers:
+                    yield from pages.popleft().result()
+            while pages:
+                yield from pages.popleft().result()
+
     def clear(self, sheet_id: str) -> None:
         """
         Delete all content in a sheet
@@ -155,12 +543,24 @@ class Sheets:
         """
         Append rows to the end of the sheet
         """
-        self.spreadsheets.values().append(
-            spreadsheetId=self.spreadsheet_id,
-            body={"values": rows},
-            range=range,
-            valueInputOption="RAW",
-        ).execute()
+        # Not retried: a request failing after the rows were written
+        # would append them twice
+        self._execute(
+            self.spreadsheets.values().append(
+                spreadsheetId=self.spreadsheet_id,
+                body={"values": rows},
+                range=range,
+                valueInputOption="RAW",
+            ),
+            num_retries=0,
+        )
+
+    def row_buffer(self, range: str, chunk_size: int = 1000) -> "RowBuffer":
+        """
+        Return a buffer to append rows to the end of the sheet in chunks
+        of `chunk_size` rows, instead of a request per row
+        """
+        return RowBuffer(self, range=range, chunk_size=chunk_size)
 
     def update_sheet_name(self, sheet_id: str, new_name: str) -> None:
         """
@@ -181,3 +581,55 @@ class Sheets:
         }
 
         self._batch_update(body)
+
+    def swap_sheet_names(self, sheet: dict, other_sheet: dict) -> None:
+        """
+        Swap the names of two sheets, as returned by get_sheet_by_title,
+        in a single atomic request
+        """
+        sheet_id = sheet["properties"]["sheetId"]
+        title = sheet["properties"]["title"]
+        other_sheet_id = other_sheet["properties"]["sheetId"]
+        other_title = other_sheet["properties"]["title"]
+
+        renames = [
+            (sheet_id, f"{title}_swap"),
+            (other_sheet_id, title),
+            (sheet_id, other_title),
+        ]
+        body = {
+            "requests": [
+                {
+                    "updateSheetProperties": {
+                        "properties": {"sheetId": id, "title": new_title},
+                        "fields": "title",
+                    }
+                }
+                for id, new_title in renames
+            ]
+        }
+
+        self._batch_update(body)
+
+
+class RowBuffer:
+    """
+    Collect rows and append them to a sheet once `chunk_size` of them
+    are waiting, or when flushed
+    """
+
+    def __init__(self, sheets: Sheets, range: str, chunk_size: int):
+        self.sheets = sheets
+        self.range = range
+        self.chunk_size = chunk_size
+        self.rows = []
+
+    def append(self, row: List[str]) -> None:
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.rows:
+            self.sheets.insert_rows(rows=self.rows, range=self.range)
+            self.rows = []
@@ -0,0 +1,86 @@
+"""
+Timings and counters of the hot paths of the app.
+
+They are Prometheus metrics, published with the metrics of talisker on
+/_status/metrics (aggregated across the gunicorn workers). When
+METRICS_ENABLED is off, `timed` leaves functions untouched and `timer`
+and `count` do nothing.
+"""
+
+import functools
+import time
+from contextlib import nullcontext
+
+from talisker.metrics import Counter, Histogram
+
+from webapp.settings import METRICS_ENABLED
+
+stage_latency = Histogram(
+    name="specs_stage_latency",
+    documentation="Duration of the stages of the requests, in ms",
+    labelnames=["stage"],
+    buckets=[1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000],
+)
+details_cache = Counter(
+    name="specs_details_cache",
+    documentation="Lookups of documents in the /spec-details cache",
+    labelnames=["result"],
+)
+details_cache_evictions = Counter(
+    name="specs_details_cache_evictions",
+    documentation="Documents evicted from the /spec-details cache",
+)
+errors = Counter(
+    name="specs_errors",
+    documentation="Errors, by stage",
+    labelnames=["stage"],
+)
+
+_disabled_timer = nullcontext()
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        duration = (time.perf_counter() - self.start) * 1000
+        stage_latency.observe(duration, stage=self.stage)
+
+
+def timer(stage: str):
+    """
+    Context manager recording the duration of a stage
+    """
+    if not METRICS_ENABLED:
+        return _disabled_timer
+    return _Timer(stage)
+
+
+def timed(stage: str):
+    """
+    Decorator recording the duration of the calls of a function
+    """
+
+    def decorator(function):
+        if not METRICS_ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _Timer(stage):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(counter, amount=1, **labels):
+    if METRICS_ENABLED:
+        counter.inc(amount, **labels)
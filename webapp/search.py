@@ -0,0 +1,198 @@
+import bisect
+import re
+import threading
+from datetime import datetime
+
+from cachetools import LRUCache
+
+from webapp.authors import normalize_name
+
+# Orders of the results, by the `sortBy` values of the client
+SORT_KEYS = ("date", "name", "index")
+
+MAX_PER_PAGE = 200
+
+token_pattern = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return token_pattern.findall(normalize_name(text))
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%d %b %Y")
+    except (TypeError, ValueError):
+        return datetime.min
+
+
+class SearchQuery:
+    """
+    A search in the specs, normalized so that equivalent queries (e.g. the
+    same filters in a different order or case) share cached results
+    """
+
+    def __init__(
+        self,
+        text="",
+        team=None,
+        statuses=(),
+        types=(),
+        author=None,
+        sort_by="date",
+        page=1,
+        per_page=50,
+    ):
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"Invalid sort: {sort_by}")
+        if page < 1 or not 1 <= per_page <= MAX_PER_PAGE:
+            raise ValueError("Invalid page")
+
+        self.terms = tuple(sorted(set(tokenize(text))))
+        self.team = team.lower() if team else None
+        self.statuses = tuple(sorted({s.lower() for s in statuses}))
+        self.types = tuple(sorted({t.lower() for t in types}))
+        self.author = normalize_name(author.strip()) if author else None
+        self.sort_by = sort_by
+        self.page = page
+        self.per_page = per_page
+
+    def key(self):
+        return (
+            self.terms,
+            self.team,
+            self.statuses,
+            self.types,
+            self.author,
+            self.sort_by,
+            self.page,
+            self.per_page,
+        )
+
+
+class SpecIndex:
+    """
+    Indexes over a list of specs for server-side search, built once:
+
+    - An inverted index from the tokens of the index, title, team, type
+      and authors of the specs to their positions. Search terms match
+      the tokens they are a prefix of, so "ubu" matches "ubuntu".
+    - Sets of positions for each status, type, team and author.
+    - The rank of each spec in every sort order.
+
+    Results are cached per normalized query.
+    """
+
+    def __init__(self, specs, cache_size=1024):
+        self.specs = specs
+        self.all = frozenset(range(len(specs)))
+
+        postings = {}
+        self.by_status = {}
+        self.by_type = {}
+        self.by_team = {}
+        self.by_author = {}
+        for position, spec in enumerate(specs):
+            text = " ".join(
+                [
+                    spec["index"],
+                    spec["title"],
+                    spec["folderName"],
+                    spec["type"],
+                ]
+                + spec["authors"]
+            )
+            for token in tokenize(text):
+                postings.setdefault(token, set()).add(position)
+
+            for facet, value in (
+                (self.by_status, spec["status"].lower()),
+                (self.by_type, spec["type"].lower()),
+                (self.by_team, spec["folderName"].lower()),
+            ):
+                facet.setdefault(value, set()).add(position)
+            for author in spec["authors"]:
+                self.by_author.setdefault(normalize_name(author), set()).add(
+                    position
+                )
+
+        # Sorted, to find the tokens starting with a term with bisect
+        self.tokens = sorted(postings)
+        self.postings = [postings[token] for token in self.tokens]
+
+        orders = {
+            "date": sorted(
+                range(len(specs)),
+                key=lambda p: parse_date(specs[p]["lastUpdated"]),
+                reverse=True,
+            ),
+            "name": sorted(range(len(specs)), key=lambda p: specs[p]["title"]),
+            "index": sorted(
+                range(len(specs)), key=lambda p: specs[p]["index"]
+            ),
+        }
+        self.ranks = {}
+        for sort_by, order in orders.items():
+            rank = [0] * len(specs)
+            for i, position in enumerate(order):
+                rank[position] = i
+            self.ranks[sort_by] = rank
+
+        self._results = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+
+    def _match_term(self, term):
+        start = bisect.bisect_left(self.tokens, term)
+        matches = set()
+        for i in range(start, len(self.tokens)):
+            if not self.tokens[i].startswith(term):
+                break
+            matches |= self.postings[i]
+        return matches
+
+    def _filter(self, query):
+        candidates = [self.all]
+        candidates.extend(self._match_term(term) for term in query.terms)
+        if query.team:
+            candidates.append(self.by_team.get(query.team, set()))
+        if query.author:
+            candidates.append(self.by_author.get(query.author, set()))
+        for values, facet in (
+            (query.statuses, self.by_status),
+            (query.types, self.by_type),
+        ):
+            if values:
+                candidates.append(
+                    set().union(*(facet.get(v, ()) for v in values))
+                )
+
+        # Start from the smallest set, the intersection can only shrink
+        candidates.sort(key=len)
+        return candidates[0].intersection(*candidates[1:])
+
+    def search(self, query: SearchQuery) -> dict:
+        """
+        Return a page of the specs matching a query, and the number of
+        specs matching it
+        """
+        key = query.key()
+        with self._lock:
+            result = self._results.get(key)
+        if result is not None:
+            return result
+
+        positions = sorted(
+            self._filter(query), key=self.ranks[query.sort_by].__getitem__
+        )
+        start = (query.page - 1) * query.per_page
+        end = start + query.per_page
+        result = {
+            "total": len(positions),
+            "page": query.page,
+            "perPage": query.per_page,
+            "specs": [self.specs[p] for p in positions[start:end]],
+        }
+
+        with self._lock:
+            self._results[key] = result
+        return result
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 
 PRIVATE_KEY_ID = os.getenv("PRIVATE_KEY_ID")
@@ -22,11 +23,67 @@ SERVICE_ACCOUNT_INFO = {
 }
 
 
+# File generated by webapp.build_specs with the specs from the spreadsheet
+SPECS_FILE = "specs.json"
+# Rows of the spreadsheet read by each request of webapp.build_specs, and
+# the requests it makes at the same time
+BUILD_SPECS_PAGE_SIZE = int(os.getenv("BUILD_SPECS_PAGE_SIZE", 500))
+BUILD_SPECS_WORKERS = int(os.getenv("BUILD_SPECS_WORKERS", 4))
+# How often (in seconds) the app checks SPECS_FILE for changes, 0 disables it.
+# entrypoint rebuilds the file every SPECS_REBUILD_INTERVAL seconds.
+SPECS_RELOAD_INTERVAL = int(os.getenv("SPECS_RELOAD_INTERVAL", 60))
+
+# Cache of the documents rendered for /spec-details, shared by all workers
+DETAILS_CACHE_PATH = os.getenv(
+    "DETAILS_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "specs-details-cache.sqlite"),
+)
+DETAILS_CACHE_MAX_SIZE = int(
+    os.getenv("DETAILS_CACHE_MAX_SIZE", 512 * 1024 * 1024)
+)
+# Cached documents older than this (in seconds) are served while they are
+# checked for changes in Google Drive
+DETAILS_REVALIDATE_AFTER = int(os.getenv("DETAILS_REVALIDATE_AFTER", 60))
+# Documents are exported from Google Drive in chunks of EXPORT_CHUNK_SIZE
+# bytes, and exports (or images of documents) larger than EXPORT_MAX_SIZE
+# bytes are abandoned
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 1024 * 1024))
+EXPORT_MAX_SIZE = int(os.getenv("EXPORT_MAX_SIZE", 64 * 1024 * 1024))
+# Record the timings and counters of webapp.metrics
+METRICS_ENABLED = bool(int(os.getenv("METRICS_ENABLED", 1)))
+# Most recently updated specs cached by entrypoint when the container
+# starts (with `flask warm-cache`), 0 disables it
+WARM_CACHE_SPECS = int(os.getenv("WARM_CACHE_SPECS", 0))
+# Threads caching specs, and the maximum of specs they cache per second
+WARM_CACHE_WORKERS = int(os.getenv("WARM_CACHE_WORKERS", 4))
+WARM_CACHE_RATE = float(os.getenv("WARM_CACHE_RATE", 5))
+
+# Directory where the update job stores the documents it renders, for
+# /spec-details to serve them without exporting them. Disabled if unset.
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR")
+# Images of the documents, served by /spec-asset. Has to be shared with the
+# update job when ARTIFACTS_DIR is set, as the documents it renders link to
+# the images it stores there.
+ASSETS_DIR = os.getenv(
+    "ASSETS_DIR", os.path.join(tempfile.gettempdir(), "specs-assets")
+)
+# Full-text index of the documents, built by the update job if set, and
+# searched by the app
+FULLTEXT_INDEX_PATH = os.getenv("FULLTEXT_INDEX_PATH")
+
 # Spreadsheet that contains the spec metadatada
 TRACKER_SPREADSHEET_ID = "1aKH6petyrzjzw0mgUNQscDhFSfVkbAIEjfH7YBS-bDA"
 
 TEAMS_FOLDER_ID = "19jxxVn_3n6ZAmFl3DReEVgZjxZnlky4X"
 
+# Where the update job keeps the documents it already parsed, so the next
+# run only fetches the ones modified since
+UPDATE_STATE_FILE = os.getenv("UPDATE_STATE_FILE", "update-state.json")
+# Threads fetching documents from Google Drive during the update
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", 8))
+# Processes parsing the fetched documents, 0 parses them in the threads
+UPDATE_PROCESSES = int(os.getenv("UPDATE_PROCESSES", os.cpu_count() or 1))
+
 # Main sheet name
 SPECS_SHEET_TITLE = "Specs"
 # Temporary sheet while the update is running
@@ -1,9 +1,16 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Union
+
 from flask import abort
 from dateutil.parser import parse
 from bs4 import BeautifulSoup
+from bs4.element import CData, NavigableString, Tag
 
 
+from webapp.assets import AssetStore, load_image
 from webapp.google import Drive
+from webapp.metrics import count, errors, timer
 
 
 specs_status = (
@@ -23,9 +30,63 @@ spec_types = (
     "process",
 )
 
+# Elements kept by Spec.clean even without text
+void_tags = ("br", "img", "hr")
+
+table_tag = re.compile(rb"<(/?)table[\s>]", re.IGNORECASE)
+
+# Images of a document downloaded at the same time
+IMAGE_WORKERS = 8
+
+# Strings counted as text by Tag.get_text, other types (comments,
+# stylesheets...) are ignored
+text_types = (NavigableString, CData)
+
+
+def first_table_html(chunks: Iterable[bytes]) -> str:
+    """
+    Return the first table of an HTML document, scanning it as it is
+    streamed and stopping as soon as the table is read
+    """
+    buffer = bytearray()
+    # Where the scan for table tags resumes
+    position = 0
+    start = None
+    depth = 0
+
+    for chunk in chunks:
+        buffer += chunk
+        for match in table_tag.finditer(buffer, position):
+            position = match.end()
+            if not match.group(1):
+                if start is None:
+                    start = match.start()
+                depth += 1
+            elif start is not None:
+                depth -= 1
+                if depth == 0:
+                    end = buffer.index(b">", match.start()) + 1
+                    return buffer[start:end].decode("utf-8")
+        # A tag can be split between this chunk and the next one
+        position = max(position, len(buffer) - len("</table>"))
+
+    # No table, or the document ended before the end of the table
+    return buffer[start:].decode("utf-8") if start is not None else ""
+
 
 class Spec:
-    def __init__(self, google_drive: Drive, document_id: str):
+    def __init__(
+        self,
+        google_drive: Drive,
+        document_id: str,
+        raw_html: Union[str, bytes] = None,
+        assets: AssetStore = None,
+    ):
+        """
+        Parse a document, exporting it from Google Drive unless its
+        `raw_html` export is given (as a string, or UTF-8 bytes).
+        Move its images to `assets` if given.
+        """
         self.document_id = document_id
         self.url = f"https://docs.google.com/document/d/{document_id}"
         self.metadata = {
@@ -37,23 +98,115 @@ class Spec:
             "created": "",
         }
 
-        try:
-            raw_html = google_drive.doc_html(document_id)
-        except Exception as e:
-            err = "Error. Document doesn't exist."
-            print(f"{err}\n {e}")
-            abort(404, description=err)
-        self.html = BeautifulSoup(raw_html, features="lxml")
-        self.clean()
-        self.parse_metadata()
+        if raw_html is None:
+            try:
+                raw_html = google_drive.doc_html(document_id)
+            except ValueError as e:
+                err = "Error. Document is too large."
+                print(f"{err}\n {e}")
+                count(errors, stage="drive_export")
+                abort(500, description=err)
+            except Exception as e:
+                err = "Error. Document doesn't exist."
+                print(f"{err}\n {e}")
+                count(errors, stage="drive_export")
+                abort(404, description=err)
+        if isinstance(raw_html, bytes):
+            # Parsing UTF-8 bytes takes more memory than decoding them first
+            # (libxml2 buffers them to convert them), and the bytes are freed
+            # here unless the caller keeps them
+            raw_html = raw_html.decode("utf-8")
+        with timer("spec_parse_html"):
+            self.html = BeautifulSoup(raw_html, features="lxml")
+        with timer("spec_clean"):
+            self.clean()
+        with timer("spec_parse_metadata"):
+            self.parse_metadata()
+        if assets:
+            with timer("spec_extract_images"):
+                self.extract_images(assets)
+
+    @classmethod
+    def metadata_only(cls, google_drive: Drive, document_id: str) -> "Spec":
+        """
+        Parse only the metadata table on top of a document, downloading
+        and parsing the export only until the end of the table
+        """
+        raw_html = first_table_html(google_drive.doc_html_chunks(document_id))
+
+        return cls(google_drive, document_id, raw_html=raw_html)
 
     def clean(self):
-        empty_tags_selector = lambda tag: (
-            not tag.contents or len(tag.get_text(strip=True)) <= 0
-        ) and tag.name not in ["br", "img", "hr"]
-        for element in self.html.findAll(empty_tags_selector):
+        """
+        Remove elements without text or images (except void_tags), and the
+        class and style attributes Google Docs sets on every element (images
+        keep their style, that sets their size)
+        """
+        elements = [
+            element
+            for element in self.html.descendants
+            if isinstance(element, Tag)
+        ]
+
+        # Whether elements contain text or images (Google Docs exports them
+        # in paragraphs without text) and how many elements they contain,
+        # computed from their children's (children come before their parent
+        # in reversed document order)
+        has_content = {}
+        sizes = {}
+        for element in reversed(elements):
+            content = element.name == "img"
+            size = 1
+            for child in element.contents:
+                if isinstance(child, Tag):
+                    content = content or has_content[id(child)]
+                    size += sizes[id(child)]
+                elif type(child) in text_types and child.strip():
+                    content = True
+            has_content[id(element)] = content
+            sizes[id(element)] = size
+
+        empty_elements = []
+        index = 0
+        while index < len(elements):
+            element = elements[index]
+
+            if element.interesting_string_types == text_types:
+                empty = not has_content[id(element)]
+            else:
+                # <style>, <script>... only contain their own kind of strings
+                empty = not element.get_text(strip=True)
+
+            if empty and element.name not in void_tags:
+                empty_elements.append(element)
+                # Skip the elements inside, removed with it
+                index += sizes[id(element)]
+                continue
+
+            element.attrs.pop("class", None)
+            if element.name != "img":
+                element.attrs.pop("style", None)
+            index += 1
+
+        for element in empty_elements:
             element.decompose()
 
+    def extract_images(self, assets: AssetStore):
+        """
+        Store the inline images and the images hosted by Google (whose
+        links expire) in `assets`, and point them to /spec-asset.
+        Images that can't be loaded are left as they are.
+        """
+        images = [img for img in self.html.select("img") if img.get("src")]
+        if not images:
+            return
+
+        with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as pool:
+            loaded = pool.map(load_image, [img["src"] for img in images])
+            for img, image in zip(images, loaded):
+                if image is not None:
+                    img["src"] = f"/spec-asset/{assets.put(*image)}"
+
     def parse_metadata(self):
         table = self.html.select_one("table")
 
@@ -69,7 +69,8 @@ def init_sso(app):
         response.headers["X-Hostname"] = socket.gethostname()
 
         if response.status_code == 200:
-            if flask.session:
+            # Keep the caching rules of responses that are already private
+            if flask.session and not response.cache_control.private:
                 response.headers["Cache-Control"] = "private"
 
         return response
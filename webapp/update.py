@@ -1,18 +1,189 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from typing import Union
+
+from webapp.artifacts import ArtifactStore
+from webapp.assets import AssetStore
+from webapp.details import render_payload
+from webapp.fulltext import FullTextIndex
 from webapp.google import Drive, Sheets
-from webapp.spec import Spec
+from webapp.spec import Spec, first_table_html
+from webapp.utils import write_json
 from webapp.settings import (
+    ARTIFACTS_DIR,
+    ASSETS_DIR,
+    FULLTEXT_INDEX_PATH,
     TRACKER_SPREADSHEET_ID,
     TEAMS_FOLDER_ID,
     SPECS_SHEET_TITLE,
     TMP_SHEET_TITLE,
+    UPDATE_STATE_FILE,
+    UPDATE_WORKERS,
+    UPDATE_PROCESSES,
 )
 
 
-def update_sheet() -> None:
+def load_state(path) -> dict:
+    """
+    Return what the previous update learnt about each document,
+    keyed by file ID
+    """
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except ValueError as e:
+        print(f"Ignoring invalid state file: {path}", e)
+        return {}
+
+
+def fetch_document(drive: Drive, file: dict) -> Union[str, bytes]:
+    """
+    Get the HTML export of a document from Google Drive, or only the
+    metadata table on top of it if documents aren't stored or indexed
+    """
+    if ARTIFACTS_DIR or FULLTEXT_INDEX_PATH:
+        return drive.doc_html(file["id"])
+
+    return first_table_html(drive.doc_html_chunks(file["id"]))
+
+
+def parse_document(
+    file: dict,
+    raw_html: Union[str, bytes],
+    artifacts_dir: str = None,
+    index_text: bool = False,
+) -> tuple:
+    """
+    Get the metadata written in the table on top of a document, and its
+    text if `index_text`. Store the rendered document in `artifacts_dir`
+    if given, and its images in ASSETS_DIR.
+
+    Settings are passed by the caller, as the parsing processes don't
+    share its state.
+    """
+    parsed_doc = Spec(
+        google_drive=None,
+        document_id=file["id"],
+        raw_html=raw_html,
+        assets=AssetStore(ASSETS_DIR) if artifacts_dir else None,
+    )
+
+    if artifacts_dir:
+        ArtifactStore(artifacts_dir).put(
+            file["id"], file["modifiedTime"], render_payload(parsed_doc)
+        )
+
+    text = None
+    if index_text:
+        text = " ".join(parsed_doc.html.get_text(" ").split())
+
+    metadata = {
+        "index": parsed_doc.metadata.get("index"),
+        "title": parsed_doc.metadata.get("title"),
+        "status": parsed_doc.metadata.get("status"),
+        "authors": parsed_doc.metadata.get("authors"),
+        "type": parsed_doc.metadata.get("type"),
+    }
+    return metadata, text
+
+
+def process_documents(
+    drive: Drive, files: list, fulltext: FullTextIndex = None
+) -> dict:
+    """
+    Count the comments of documents in batch requests, export them
+    concurrently in UPDATE_WORKERS threads and parse them in
+    UPDATE_PROCESSES processes (or in the fetching threads if 0).
+    Index their text in `fulltext` if given.
+
+    Return the documents successfully processed, keyed by file ID.
+    """
+    comments = drive.get_comments_bulk([file["id"] for file in files])
+    files = [file for file in files if file["id"] in comments]
+
+    if UPDATE_PROCESSES:
+        # Processes are started when the first document is parsed, while
+        # the fetching threads may hold locks (e.g. of the metrics), that
+        # forked processes would inherit held. Start them from a server
+        # process without threads instead.
+        parse_pool = ProcessPoolExecutor(
+            max_workers=UPDATE_PROCESSES,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    else:
+        parse_pool = ThreadPoolExecutor(max_workers=UPDATE_WORKERS)
+
+    with ThreadPoolExecutor(max_workers=UPDATE_WORKERS) as fetch_pool:
+        fetches = {
+            fetch_pool.submit(fetch_document, drive, file): file
+            for file in files
+        }
+        parses = {}
+        for fetch in as_completed(fetches):
+            file = fetches[fetch]
+            try:
+                html = fetch.result()
+            except Exception as e:
+                print(f"Unable to fetch document: {file['name']}", e)
+                continue
+            parses[file["id"]] = (
+                file,
+                comments[file["id"]],
+                parse_pool.submit(
+                    parse_document,
+                    file,
+                    html,
+                    ARTIFACTS_DIR,
+                    fulltext is not None,
+                ),
+            )
+
+    documents = {}
+    texts = []
+    with parse_pool:
+        for file_id, (file, document, parse) in parses.items():
+            try:
+                document["metadata"], text = parse.result()
+            except Exception as e:
+                print(f"Unable to parse document: {file['name']}", e)
+                continue
+            document["modifiedTime"] = file["modifiedTime"]
+            documents[file_id] = document
+            texts.append(
+                (
+                    file_id,
+                    file["modifiedTime"],
+                    document["metadata"]["title"],
+                    text,
+                )
+            )
+
+    if fulltext:
+        fulltext.update(texts)
+
+    return documents
+
+
+def update_sheet(full: bool = False) -> None:
     """
     Get specs from Google Drive, parse the metadata on top of the document
     and write into a spreadsheet
+
+    Only documents modified since the last update are fetched and parsed,
+    unless `full` is set, the others are copied from UPDATE_STATE_FILE.
     """
+    previous_state = {} if full else load_state(UPDATE_STATE_FILE)
+    state = {}
+
     drive = Drive()
     sheets = Sheets(spreadsheet_id=TRACKER_SPREADSHEET_ID)
 
@@ -21,26 +192,26 @@ def update_sheet() -> None:
 
     sheets.clear(sheet_id=tmp_sheet["properties"]["sheetId"])
 
+    # Rows are sent in chunks, all of them before the sheets are renamed
+    rows = sheets.row_buffer(range=TMP_SHEET_TITLE)
+
     # Add headers
-    sheets.insert_rows(
-        rows=[
-            [
-                "Folder name",
-                "File name",
-                "File ID",
-                "File URL",
-                "Index",
-                "Title",
-                "Status",
-                "Authors",
-                "Type",
-                "Created",
-                "Last updated",
-                "Number of comments",
-                "Number of open comments",
-            ]
-        ],
-        range=TMP_SHEET_TITLE,
+    rows.append(
+        [
+            "Folder name",
+            "File name",
+            "File ID",
+            "File URL",
+            "Index",
+            "Title",
+            "Status",
+            "Authors",
+            "Type",
+            "Created",
+            "Last updated",
+            "Number of comments",
+            "Number of open comments",
+        ]
     )
 
     query_subfolders = (
@@ -49,62 +220,73 @@ def update_sheet() -> None:
     )
     folders = drive.get_files(query=query_subfolders, fields=("id", "name"))
 
-    for folder in folders:
-        query_doc_files = (
-            f"mimeType = 'application/vnd.google-apps.document' "
-            f"and '{folder['id']}' in parents"
-        )
-        files = drive.get_files(
-            query=query_doc_files,
-            fields=(
-                "id",
-                "name",
-                "createdTime",
-                "modifiedTime",
-                "webViewLink",
-            ),
-        )
-        for file in files:
-            try:
-                comments = drive.get_comments(
-                    file_id=file["id"], fields=("resolved",)
-                )
-                open_comments = [c for c in comments if not c["resolved"]]
+    files_by_folder = drive.get_files_in_folders(
+        folder_ids=[folder["id"] for folder in folders],
+        query="mimeType = 'application/vnd.google-apps.document'",
+        fields=(
+            "id",
+            "name",
+            "createdTime",
+            "modifiedTime",
+            "webViewLink",
+        ),
+    )
+    folder_files = [
+        (folder, files_by_folder[folder["id"]]) for folder in folders
+    ]
 
-                parsed_doc = Spec(google_drive=drive, document_id=file["id"])
-            except Exception as e:
-                print(f"Unable to parse document: {file['name']}", e)
+    artifacts = ArtifactStore(ARTIFACTS_DIR) if ARTIFACTS_DIR else None
+    fulltext = None
+    if FULLTEXT_INDEX_PATH:
+        fulltext = FullTextIndex(FULLTEXT_INDEX_PATH)
+        fulltext.create()
+        indexed = fulltext.versions()
+    modified_files = [
+        file
+        for _, files in folder_files
+        for file in files
+        if file["id"] not in previous_state
+        or previous_state[file["id"]]["modifiedTime"] != file["modifiedTime"]
+        or (artifacts and not artifacts.exists(file["id"]))
+        or (fulltext and indexed.get(file["id"]) != file["modifiedTime"])
+    ]
+    documents = process_documents(drive, modified_files, fulltext=fulltext)
+
+    for folder, files in folder_files:
+        for file in files:
+            document = documents.get(file["id"])
+            if document is None:
+                document = previous_state.get(file["id"])
+            # New document that couldn't be processed
+            if document is None:
                 continue
+            state[file["id"]] = document
 
+            metadata = document["metadata"]
             row = [
                 folder["name"],
                 file["name"],
                 file["id"],
                 file["webViewLink"],
-                parsed_doc.metadata.get("index"),
-                parsed_doc.metadata.get("title"),
-                parsed_doc.metadata.get("status"),
-                ", ".join(parsed_doc.metadata.get("authors")),
-                parsed_doc.metadata.get("type"),
+                metadata["index"],
+                metadata["title"],
+                metadata["status"],
+                ", ".join(metadata["authors"]),
+                metadata["type"],
                 file["createdTime"],
                 file["modifiedTime"],
-                len(comments),
-                len(open_comments),
+                document["numberOfComments"],
+                document["openComments"],
             ]
-            sheets.insert_rows(
-                rows=[row],
-                range=TMP_SHEET_TITLE,
-            )
+            rows.append(row)
+
+    rows.flush()
+
+    if fulltext:
+        # Documents deleted or moved out of the team folders
+        fulltext.update([], keep=state)
 
     # Rename temporary file as the main one once it contains all the specs
-    sheets.update_sheet_name(
-        sheet_id=specs_sheet["properties"]["sheetId"], new_name="tmp"
-    )
-    sheets.update_sheet_name(
-        sheet_id=tmp_sheet["properties"]["sheetId"],
-        new_name=SPECS_SHEET_TITLE,
-    )
-    sheets.update_sheet_name(
-        sheet_id=specs_sheet["properties"]["sheetId"],
-        new_name=TMP_SHEET_TITLE,
-    )
+    sheets.swap_sheet_names(specs_sheet, tmp_sheet)
+
+    write_json(UPDATE_STATE_FILE, state)
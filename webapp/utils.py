@@ -0,0 +1,44 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path):
+    """
+    Open a temporary file for writing, renamed to `path` once written, so
+    readers never see a half written file. It is removed if writing fails.
+    """
+    with tempfile.NamedTemporaryFile(
+        "w", dir=os.path.dirname(os.path.abspath(path)), delete=False
+    ) as f:
+        try:
+            yield f
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+
+def write_json(path, data, **kwargs):
+    """
+    Write data as JSON to `path`, atomically
+    """
+    with atomic_write(path) as f:
+        json.dump(data, f, **kwargs)
+
+
+def write_json_array(path, items, **kwargs):
+    """
+    Write the items of an iterable as a JSON array to `path`, atomically,
+    encoding them one at a time as they are produced
+    """
+    with atomic_write(path) as f:
+        f.write("[")
+        for index, item in enumerate(items):
+            if index:
+                f.write(",\n")
+            json.dump(item, f, **kwargs)
+        f.write("]\n")
@@ -0,0 +1,63 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from webapp.details import SpecDetails
+
+
+class RateLimiter:
+    """
+    Space out calls to `wait`, shared by several threads, so that they
+    return at most `rate` times per second
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate else 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def warm_cache(
+    spec_details: SpecDetails, document_ids: list, workers: int, rate: float
+) -> None:
+    """
+    Cache documents for /spec-details in `workers` threads, at most
+    `rate` documents per second, reporting the progress
+    """
+    limiter = RateLimiter(rate)
+
+    def warm(document_id):
+        limiter.wait()
+        start = time.monotonic()
+        spec_details.warm(document_id)
+        return time.monotonic() - start
+
+    start = time.monotonic()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        warming = {
+            pool.submit(warm, document_id): document_id
+            for document_id in document_ids
+        }
+        for done, future in enumerate(as_completed(warming), start=1):
+            document_id = warming[future]
+            try:
+                duration = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Unable to cache document: {document_id}", e)
+                continue
+            print(f"[{done}/{len(warming)}] {document_id} {duration:.2f}s")
+
+    print(
+        f"Cached {len(document_ids) - failed} documents"
+        f" in {time.monotonic() - start:.1f}s, {failed} failed"
+    )